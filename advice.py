@@ -0,0 +1,240 @@
+"""
+Declarative advice rules.
+
+Every piece of advice the app shows is a rule written as plain data in
+RULES: the group it belongs to, its conditions (feature, operator,
+threshold; all must hold), a message template and any derived values the
+template shows. The rules are compiled once at import into RULESET, a
+RuleSet that checks each condition against a flat feature vector
+(indexed by FEATURES) in a single pass.
+
+Feature vectors are built from totals the callers already hold (the
+7-day insights, the insight page aggregates), so adding a rule adds no
+query and no pass over transactions.
+
+Groups:
+  weekly     dashboard / nightly suggestions from the last 7 days
+  behaviour  behaviour panel on the insights page
+  advice     smart advice on the insights page
+"""
+import operator
+from string import Formatter
+
+# (name, default) in vector order
+FEATURES = (
+    # Last 7 days (RollingWindows.insights / predictions.get_weekly_insights)
+    ('week_spent', 0),
+    ('week_txns', 0),
+    ('week_food', 0),
+    ('week_food_share', 0),
+    ('week_travel', 0),
+    ('week_travel_share', 0),
+    ('week_shopping_share', 0),
+    ('week_expensive_day', 'None'),
+    # Insights page totals
+    ('expense_total', 0),
+    ('food_expense', 0),
+    ('food_share', 0),
+    ('weekend_share', 0),
+    ('month_txns', 0),
+    ('avg_daily_spend', 0),
+    ('highest_category', None),
+    ('highest_day', None),
+)
+_INDEX = {name: i for i, (name, _) in enumerate(FEATURES)}
+_DEFAULTS = [default for _, default in FEATURES]
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'in': lambda value, options: value in options,
+}
+
+# 'values' maps a template field to (feature, factor, digits): the feature
+# times factor, rounded to digits places, or truncated to an int if None.
+# A 'stop' rule replaces everything else in its group when it matches.
+RULES = [
+    # --- Weekly suggestions ---
+    {'name': 'weekly_no_expenses', 'group': 'weekly', 'stop': True,
+     'when': [('week_spent', '<=', 0)],
+     'message': "Add some expenses this week to get personalized insights!"},
+    {'name': 'weekly_food', 'group': 'weekly',
+     'when': [('week_food_share', '>', 0.40)],
+     'message': "🍔 Cooking at home 2 times this week could save ₹{savings}",
+     'values': {'savings': ('week_food', 0.3, 2)}},
+    {'name': 'weekly_travel', 'group': 'weekly',
+     'when': [('week_travel_share', '>', 0.30)],
+     'message': "🚌 Using bus instead of auto 3 times could save ₹{savings}",
+     'values': {'savings': ('week_travel', 0.4, 2)}},
+    {'name': 'weekly_frequency', 'group': 'weekly',
+     'when': [('week_txns', '>', 10)],
+     'message': "⚠️ High transaction frequency detected. Beware of micro-spending leaks."},
+    {'name': 'weekly_weekend', 'group': 'weekly',
+     'when': [('week_expensive_day', 'in', ('Saturday', 'Sunday'))],
+     'message': "⚠️ High weekend spending detected. Consider planning weekend budgets in advance."},
+    {'name': 'weekly_shopping', 'group': 'weekly',
+     'when': [('week_shopping_share', '>', 0.25)],
+     'message': "🛍️ Reduce online shopping orders this week to protect your budget."},
+
+    # --- Behaviour panel ---
+    {'name': 'top_category', 'group': 'behaviour',
+     'when': [('highest_category', '!=', None)],
+     'message': "Most of your money is going to {highest_category}."},
+    {'name': 'top_weekday', 'group': 'behaviour',
+     'when': [('highest_day', '!=', None)],
+     'message': "You spend the most on {highest_day}s."},
+    {'name': 'transaction_count', 'group': 'behaviour',
+     'message': "You made {month_txns} transactions recently."},
+    {'name': 'average_daily', 'group': 'behaviour',
+     'message': "Average daily spend is ₹{average}.",
+     'values': {'average': ('avg_daily_spend', 1, None)}},
+
+    # --- Smart advice ---
+    {'name': 'month_food', 'group': 'advice',
+     'when': [('food_share', '>', 0.40)],
+     'message': "🍔 Cooking at home could save you ₹{savings} this month.",
+     'values': {'savings': ('food_expense', 0.3, None)}},
+    {'name': 'month_weekend', 'group': 'advice',
+     'when': [('weekend_share', '>', 0.30)],
+     'message': "⚠️ High weekend spending detected. Carefully plan weekend outings."},
+    {'name': 'month_frequency', 'group': 'advice',
+     'when': [('month_txns', '>', 15)],
+     'message': "🛍️ Frequent micro-spending detected. Try consolidating purchases."},
+]
+
+# Shown when nothing in the group matched
+OTHERWISE = {
+    'weekly': "✨ Great job! Your spending categories look well-balanced this week.",
+    'advice': "✨ Your spending habits are healthy! Keep it up.",
+}
+
+
+def features(**values):
+    """A feature vector; features not given keep their defaults."""
+    vector = list(_DEFAULTS)
+    for name, value in values.items():
+        vector[_feature_index(name)] = value
+    return vector
+
+
+def share(part, total):
+    return part / total if total > 0 else 0
+
+
+def weekly_features(insights):
+    """Feature vector for the weekly group from a 7-day insights dict (or None)."""
+    if not insights:
+        return features()
+    total = insights['total_spent']
+    categories = insights['categories']
+    return features(
+        week_spent=total,
+        week_txns=insights['num_txns'],
+        week_food=categories.get('Food', 0),
+        week_food_share=share(categories.get('Food', 0), total),
+        week_travel=categories.get('Travel', 0),
+        week_travel_share=share(categories.get('Travel', 0), total),
+        week_shopping_share=share(categories.get('Shopping', 0), total),
+        week_expensive_day=insights.get('expensive_day', 'None'),
+    )
+
+
+def _feature_index(name, rule=None):
+    try:
+        return _INDEX[name]
+    except KeyError:
+        where = f"Rule {rule!r}: " if rule else ""
+        raise ValueError(f"{where}unknown feature {name!r}") from None
+
+
+class Rule:
+    __slots__ = ('name', 'group', 'stop', 'message', 'conditions', 'fields', 'values')
+
+    def __init__(self, spec):
+        self.name = spec['name']
+        self.group = spec['group']
+        self.stop = spec.get('stop', False)
+        self.message = spec['message']
+        conditions = []
+        for feature, op, threshold in spec.get('when', ()):
+            if op not in OPERATORS:
+                raise ValueError(f"Rule {self.name!r}: unknown operator {op!r}")
+            conditions.append((_feature_index(feature, self.name), OPERATORS[op], threshold))
+        self.conditions = tuple(conditions)
+        values = spec.get('values', {})
+        self.values = tuple(
+            (field, _feature_index(feature, self.name), factor, digits)
+            for field, (feature, factor, digits) in values.items()
+        )
+        # Any other template field is a feature shown as is
+        self.fields = tuple(
+            (field, _feature_index(field, self.name))
+            for _, field, _, _ in Formatter().parse(self.message)
+            if field and field not in values
+        )
+
+    def matches(self, vector):
+        for index, test, threshold in self.conditions:
+            if not test(vector[index], threshold):
+                return False
+        return True
+
+    def render(self, vector):
+        fields = {field: vector[index] for field, index in self.fields}
+        for field, index, factor, digits in self.values:
+            value = vector[index] * factor
+            fields[field] = int(value) if digits is None else round(value, digits)
+        return self.message.format(**fields)
+
+
+class RuleSet:
+    def __init__(self, specs, otherwise=None):
+        self.rules = tuple(Rule(spec) for spec in specs)
+        self.otherwise = dict(otherwise or {})
+        self.groups = tuple(dict.fromkeys(rule.group for rule in self.rules))
+        self._by_name = {}
+        for rule in self.rules:
+            if rule.name in self._by_name:
+                raise ValueError(f"Duplicate rule {rule.name!r}")
+            self._by_name[rule.name] = rule
+
+    def rule(self, name):
+        return self._by_name[name]
+
+    def _select(self, groups):
+        if groups is None:
+            return self.groups, self.rules
+        groups = tuple(groups)
+        return groups, tuple(rule for rule in self.rules if rule.group in groups)
+
+    def _evaluate(self, groups, rules, vector):
+        results = {group: [] for group in groups}
+        stopped = set()
+        for rule in rules:
+            if rule.group in stopped or not rule.matches(vector):
+                continue
+            if rule.stop:
+                results[rule.group] = [rule.render(vector)]
+                stopped.add(rule.group)
+            else:
+                results[rule.group].append(rule.render(vector))
+        for group, messages in results.items():
+            if not messages and group in self.otherwise:
+                messages.append(self.otherwise[group])
+        return results
+
+    def evaluate(self, vector, groups=None):
+        """{group: [messages]} for one feature vector."""
+        return self._evaluate(*self._select(groups), vector)
+
+    def evaluate_many(self, vectors, groups=None):
+        """evaluate() for many users' vectors, selecting the rules once."""
+        groups, rules = self._select(groups)
+        return [self._evaluate(groups, rules, vector) for vector in vectors]
+
+
+RULESET = RuleSet(RULES, OTHERWISE)
@@ -1,74 +1,179 @@
 import os
-from datetime import datetime, date, timedelta
-import math
-import re
+from datetime import datetime, date
+import itertools
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
 import sqlite3
 from sqlite3 import Error
-from predictions import get_weekly_insights, get_smart_suggestions, calculate_streak
+import advice
+import db
+from events import EventBus
+import ledger
+from cache import AnalyticsCache, get_data_version
+from importer import import_transactions
+import sms_parser
+from categorizer import Categorizer, DEFAULT_TABLE, load_rules, rules_from_table
+from merchants import MerchantIndex
+import forecasting
+from metrics import MonthMetrics, SafeSpendCache, survival_days
+import nightly
+from windows import WINDOW_SIZES, WindowStore
+from writebehind import WriteBehindQueue
+from migrations import migrate
+from predictions import get_smart_suggestions, current_streak, compute_stability_score
 
 app = Flask(__name__)
 app.secret_key = 'super_secret_student_finance_key'
 
-# Ensure SQLite path is absolute so the DB is found in production
+# Ensure SQLite path is absolute so the DB is found in production;
+# DATABASE_PATH points elsewhere (benchmarks use a scratch database)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-db_path = os.path.join(BASE_DIR, "finance_tracker.db")
+db_path = os.path.abspath(os.environ.get('DATABASE_PATH') or os.path.join(BASE_DIR, "finance_tracker.db"))
 DATABASE = db_path
 # Helpful for apps that use SQLAlchemy; harmless if not used
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + db_path
 
+# One pooled connection per request, returned to the pool on teardown; size
+# it to the worker's thread count (see gunicorn.conf.py)
+db.init_app(app, DATABASE, max_size=int(os.environ.get('DB_POOL_SIZE', os.environ.get('GUNICORN_THREADS', 8))))
+
+# Keyword table for auto_categorize; CATEGORY_RULES_FILE points at a JSON override
+_rules_file = os.environ.get('CATEGORY_RULES_FILE')
+categorizer = Categorizer(
+    load_rules(_rules_file) if _rules_file else rules_from_table(DEFAULT_TABLE),
+    default='Others',
+)
+
+# Learned per-user merchant categories, consulted before the keyword table
+merchant_index = MerchantIndex()
+
+# Per-user analytics cache; set ANALYTICS_CACHE_BACKEND=sqlite to share it across workers
+analytics_cache = AnalyticsCache(
+    max_users=int(os.environ.get('ANALYTICS_CACHE_USERS', 1024)),
+    ttl=float(os.environ.get('ANALYTICS_CACHE_TTL', 300)),
+    backend=os.environ.get('ANALYTICS_CACHE_BACKEND', 'memory'),
+)
+
+# Rolling 7/30/90-day expense windows per user behind insights, suggestions
+# and the 30-day chart; ?window= picks the insights window
+rolling_windows = WindowStore(max_users=int(os.environ.get('ANALYTICS_CACHE_USERS', 1024)))
+INSIGHTS_WINDOW = 7
+
+# /check_budget fast path: safe daily spend per user, checked against data_version
+safe_spend_cache = SafeSpendCache(max_users=int(os.environ.get('ANALYTICS_CACHE_USERS', 1024)))
+
+# Live dashboard updates over SSE; LIVE_EVENTS_BACKEND=sqlite fans out across workers
+# (gunicorn.conf.py makes it the default with more than one).
+# Each stream holds a thread, so a worker keeps at most LIVE_MAX_STREAMS open
+# (gunicorn.conf.py adds that many threads) and further pages poll /api/live_state
+live_events = EventBus(
+    backend=os.environ.get('LIVE_EVENTS_BACKEND', 'memory'),
+    database=DATABASE,
+    max_streams=int(os.environ.get('LIVE_MAX_STREAMS', 32)),
+)
+LIVE_STREAM_SECONDS = int(os.environ.get('LIVE_STREAM_SECONDS', 300))
+
+# Optional write-behind for /api/quick_add: QUICK_ADD_WRITE_BEHIND=1 queues the
+# inserts and commits them in groups every WRITE_BEHIND_MS or WRITE_BEHIND_ROWS
+def _notify_flushed(conn, user_ids):
+    for user_id in user_ids:
+        notify_write(conn, user_id)
+
+quick_add_queue = None
+if os.environ.get('QUICK_ADD_WRITE_BEHIND') == '1':
+    quick_add_queue = WriteBehindQueue(
+        DATABASE,
+        interval=int(os.environ.get('WRITE_BEHIND_MS', 50)) / 1000,
+        max_batch=int(os.environ.get('WRITE_BEHIND_ROWS', 500)),
+        on_flush=_notify_flushed,
+    )
+
+# Upper bound on Monte Carlo paths a single should_i_buy request may ask for
+MAX_SIMULATION_PATHS = 50000
+
+# Upper bound on items plus bundles in one /api/should_i_buy/batch request
+MAX_BATCH_CANDIDATES = 500
+
+@app.before_request
+def flush_queued_writes():
+    """Read-your-writes: commit the user's queued quick adds before anything reads them."""
+    if quick_add_queue is not None and 'user_id' in session and request.endpoint != 'api_quick_add':
+        try:
+            quick_add_queue.flush_user(session['user_id'])
+        except Exception as e:
+            # The rows stay queued for the writer thread; serve the request
+            # rather than fail it for a flush that may involve other users
+            print(f"Write-behind flush failed: {e}")
+
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db.get_db()
 
 def init_db():
-    conn = get_db_connection()
-    c = conn.cursor()
-    # Create Users Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            monthly_budget REAL DEFAULT 5000,
-            savings_goal REAL DEFAULT 1000
-        )
-    ''')
-    # Create Transactions Table
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            amount REAL NOT NULL,
-            category TEXT NOT NULL,
-            type TEXT NOT NULL, -- 'income' or 'expense'
-            description TEXT,
-            date TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    conn.commit()
+    conn = db.connect(DATABASE)
+    # Creates the tables on first run and upgrades older databases in place
+    migrate(conn)
     conn.close()
 
 init_db()
 
 
-def compute_stability_score(total_income: float, total_expense: float, available_balance: float) -> int:
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Regenerate the daily rollups and streak state from the raw transactions."""
+    conn = db.connect(DATABASE)
+    drift = ledger.rollup_drift(conn)
+    ledger.rebuild_rollups(conn)
+    ledger.rebuild_streak_state(conn)
+    conn.commit()
+    conn.close()
+    print(f"Rebuilt daily rollups ({drift} rows were out of sync).")
+
+
+def get_month_summary(conn, user_id, now):
+    """Cached ledger.fetch_month_summary() for now's month."""
+    first_day = ledger.month_start(now)
+    return analytics_cache.get_or_compute(
+        conn, user_id, f'month_summary:{first_day}',
+        lambda: ledger.fetch_month_summary(conn, user_id, first_day))
+
+
+def get_month_metrics(conn, user_id, now):
+    """MonthMetrics snapshot for now's month, from the cached summary."""
+    return MonthMetrics(get_month_summary(conn, user_id, now), now)
+
+
+def notify_write(conn, user_id, **changes):
     """
-    Shared stability score (0–100) for dashboard and decision engine.
-    Higher when savings ratio is good and expense ratio is lower.
+    Call after committing a write for the user: drops their cached
+    analytics and pushes the new balance, safe daily spend and streak (plus
+    ``changes``, e.g. the new transaction) to their open live streams.
     """
-    score = 50
-    if total_income > 0:
-        savings_ratio = available_balance / total_income
-        expense_ratio = total_expense / total_income
-        score = 50 + (savings_ratio * 30) - (expense_ratio * 20)
-    else:
-        # If there is only spending and no income logged, penalize
-        score = 50 - (total_expense / 100.0)
+    analytics_cache.invalidate(conn, user_id)
+    safe_spend_cache.discard(user_id)
+    if not live_events.has_listeners(conn, user_id):
+        return
+    live_events.publish(conn, user_id, 'update', {**get_live_state(conn, user_id), **changes})
+
+
+def get_live_state(conn, user_id):
+    """The figures live updates carry: balance, safe daily spend and streak."""
+    now = datetime.now()
+    metrics = get_month_metrics(conn, user_id, now)
+    return {
+        'balance': metrics.available_balance,
+        'current_balance': metrics.current_balance,
+        'safe_daily_spend': metrics.safe_daily_spend,
+        'streak': get_streak(conn, user_id, now),
+    }
+
+
+def get_insights_window(args):
+    """Window size from a ?window= query parameter, 7 days unless valid."""
+    window = args.get('window', INSIGHTS_WINDOW, type=int)
+    return window if window in WINDOW_SIZES else INSIGHTS_WINDOW
 
-    return max(0, min(100, int(score)))
+
+def get_streak(conn, user_id, now):
+    return current_streak(conn, user_id, ledger.to_day(now))
 
 @app.route('/')
 def index():
@@ -90,8 +195,6 @@ def register():
             return redirect(url_for('login'))
         except sqlite3.IntegrityError:
             flash('Username already exists.', 'danger')
-        finally:
-            conn.close()
             
     return render_template('register.html')
 
@@ -103,7 +206,6 @@ def login():
         
         conn = get_db_connection()
         user = conn.execute('SELECT * FROM users WHERE username = ? AND password = ?', (username, password)).fetchone()
-        conn.close()
         
         if user:
             session['user_id'] = user['id']
@@ -119,21 +221,16 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
-def auto_categorize(description):
-    """Simple keyword matching to auto-categorize expenses."""
-    desc = str(description).lower()
-    mapping = {
-        'swiggy': 'Food', 'zomato': 'Food', 'dominos': 'Food', 'mcdonalds': 'Food', 'cafe': 'Food', 'coffee': 'Food',
-        'uber': 'Travel', 'ola': 'Travel', 'rapido': 'Travel', 'metro': 'Travel', 'bus': 'Travel', 'train': 'Travel',
-        'amazon': 'Shopping', 'flipkart': 'Shopping', 'myntra': 'Shopping', 'zara': 'Shopping', 'h&m': 'Shopping',
-        'jio': 'Recharge', 'airtel': 'Recharge', 'vi': 'Recharge', 'wifi': 'Recharge', 'internet': 'Recharge',
-        'fees': 'Fees', 'college': 'Fees', 'tuition': 'Fees', 'library': 'Fees', 'exam': 'Fees',
-        'movie': 'Entertainment', 'netflix': 'Entertainment', 'spotify': 'Entertainment', 'steam': 'Entertainment'
-    }
-    for keyword, category in mapping.items():
-        if keyword in desc:
-            return category
-    return 'Others'
+def auto_categorize(description, conn=None, user_id=None):
+    """
+    Auto-categorize an expense: the user's learned merchant categories
+    first, then keyword matching (one automaton pass).
+    """
+    if user_id is not None:
+        learned = merchant_index.lookup(conn, user_id, description)
+        if learned:
+            return learned
+    return categorizer.categorize(str(description))
 
 @app.route('/dashboard')
 def dashboard():
@@ -146,114 +243,62 @@ def dashboard():
     
     # Dates and month window
     now = datetime.now()
-    first_day_of_month = f"{now.year}-{now.month:02d}-01"
-
-    # Fetch all user transactions once, then derive monthly views in Python
-    cursor = conn.execute('''
-        SELECT * FROM transactions 
-        WHERE user_id = ?
-        ORDER BY date DESC
-    ''', (user_id,))
-    all_transactions = [dict(row) for row in cursor.fetchall()]
-
-    # Filter to current month for dashboard summaries and charts
-    transactions = [t for t in all_transactions if t['date'] >= first_day_of_month]
-    
-    # Basic Calculations for current month
-    total_expense = sum(t['amount'] for t in transactions if t['type'] == 'expense')
-    total_income = sum(t['amount'] for t in transactions if t['type'] == 'income')
+    first_day_of_month = ledger.month_start(now)
+
+    today = ledger.to_day(now)
+
+    # Month metrics come from the (cached) daily rollups
+    metrics = get_month_metrics(conn, user_id, now)
+
+    # Only the most recent records are shown
+    cursor = conn.execute(f'''
+        SELECT {ledger.TRANSACTION_COLUMNS} FROM transactions 
+        WHERE user_id = ? AND day >= ?
+        ORDER BY day DESC, id DESC
+        LIMIT 10
+    ''', (user_id, first_day_of_month))
+    transactions = [ledger.row_to_dict(row) for row in cursor]
     
-    import calendar
-    days_in_month = calendar.monthrange(now.year, now.month)[1]
     current_day = now.day
-    days_remaining = max(days_in_month - current_day, 1)
-    
-    # Real balance model
-    current_balance = total_income - total_expense  # can be negative
-    # Non-negative balance used for survival calculations
-    available_balance = max(current_balance, 0)
-    
-    safe_daily_spend = available_balance / days_remaining if days_remaining > 0 else available_balance
+    days_remaining = metrics.days_remaining
+    available_balance = metrics.available_balance
+    avg_daily_spend = metrics.avg_daily_spend
     
+    # Insights, suggestions and the trend chart share the rolling windows
+    rolling = rolling_windows.get(conn, user_id, today)
+    insights_window = get_insights_window(request.args)
+
     # --- CHART 1: Spending Trend (Last 30 Days) ---
-    thirty_days_ago = (now - timedelta(days=30)).strftime('%Y-%m-%d')
-    cursor = conn.execute('''
-        SELECT date, SUM(amount) as daily_total 
-        FROM transactions 
-        WHERE user_id = ? AND date >= ? AND type = 'expense'
-        GROUP BY date ORDER BY date ASC
-    ''', (user_id, thirty_days_ago))
-    daily_spend_data = cursor.fetchall()
-    
-    # Generate 30 day sequence filling missing days with 0
-    from collections import defaultdict
-    daily_dict = {row['date']: row['daily_total'] for row in daily_spend_data}
-    chart_dates = []
-    chart_spent = []
-    
-    for i in range(30, -1, -1):
-        d = (now - timedelta(days=i)).strftime('%Y-%m-%d')
-        chart_dates.append(d[-5:]) # MM-DD format
-        chart_spent.append(daily_dict.get(d, 0))
+    # 30 day sequence with missing days as 0
+    chart_dates = [ledger.from_day(d)[-5:] for d in range(today - 30, today + 1)] # MM-DD format
+    chart_spent = [ledger.from_paise(paise) for paise in rolling.daily(30)]
 
     # --- CHART 2: Category Doughnut ---
-    category_totals = defaultdict(float)
-    for t in transactions:
-        if t['type'] == 'expense':
-            category_totals[t['category']] += t['amount']
-    
-    cat_labels = list(category_totals.keys())
-    cat_values = list(category_totals.values())
+    cat_labels = [category for category, _ in metrics.categories]
+    cat_values = [ledger.from_paise(total) for _, total in metrics.categories]
     
     # --- CHART 3: Balance Forecast Array ---
-    forecast_data = []
-    current_proj_balance = available_balance
-    avg_daily_spend = total_expense / current_day if current_day > 0 else 0
-    
-    for i in range(1, days_remaining + 1):
-        forecast_data.append(max(0, current_proj_balance))
-        current_proj_balance -= avg_daily_spend
+    forecast_data = forecasting.project_from_spend(available_balance, avg_daily_spend, days_remaining)[0].tolist()
+    current_proj_balance = available_balance - avg_daily_spend * days_remaining
         
     forecast_labels = [f"Day {current_day + i}" for i in range(1, days_remaining + 1)]
     
     # Message for Forecast
     forecast_message = "You are safe."
     if current_proj_balance <= 0:
-        days_until_zero = available_balance / avg_daily_spend if avg_daily_spend > 0 else 999
-        forecast_message = f"At this rate you may run out of money in {int(days_until_zero)} days."
+        forecast_message = f"At this rate you may run out of money in {metrics.days_to_zero} days."
 
     # --- NEW CAPABILITIES ---
-    from predictions import get_weekly_insights, get_smart_suggestions, calculate_streak
-    weekly_insights = get_weekly_insights(all_transactions, now)
-    suggestions = get_smart_suggestions(weekly_insights, total_expense)
-    # No-spend streak uses full history so older expenses correctly break the streak
-    streak = calculate_streak(all_transactions)
-    
-    # Financial Stability Score Base Calc (shared formula)
-    score = compute_stability_score(total_income, total_expense, available_balance)
-    
-    # Alert Logic for Hero
-    alert_color = "success"
-    days_to_zero = days_remaining
-    
-    if avg_daily_spend > 0:
-        days_to_zero = int(available_balance / avg_daily_spend) if available_balance > 0 else 0
-    else:
-        days_to_zero = 999
-        
-    if days_to_zero < days_remaining:
-        alert_color = "danger"
-    elif days_to_zero <= days_remaining + 3:
-        alert_color = "warning"
-        
-    # Pass down additional predictive data
+    weekly_insights = rolling.insights(insights_window)
+    suggestions = get_smart_suggestions(weekly_insights, metrics.total_expense)
+    streak = get_streak(conn, user_id, now)
     
     return render_template('dashboard.html', 
         user=user, 
         balance=available_balance,
-        current_balance=current_balance,
-        safe_daily_spend=safe_daily_spend,
-        transactions=transactions[:10], # recent 10 records
+        current_balance=metrics.current_balance,
+        safe_daily_spend=metrics.safe_daily_spend,
+        transactions=transactions, # recent 10 records (LIMIT in SQL)
         chart_dates=chart_dates,
         chart_spent=chart_spent,
         cat_labels=cat_labels,
@@ -264,11 +309,12 @@ def dashboard():
         
         # New Context Variables
         remaining_days=days_remaining,
-        forecast_days=days_to_zero,
+        forecast_days=metrics.days_to_zero,
         weekly_avg_daily_expense=avg_daily_spend,
-        financial_score=score,
-        alert_color=alert_color,
+        financial_score=metrics.stability_score,
+        alert_color=metrics.status,
         suggestions=suggestions,
+        insights_window=insights_window,
         streak=streak
     )
 
@@ -280,145 +326,59 @@ def insights():
     user_id = session['user_id']
     conn = get_db_connection()
     
-    # 1. Fetch all transactions for the logged-in user
-    cursor = conn.execute('''
-        SELECT id, amount, category, type, description, date 
-        FROM transactions 
-        WHERE user_id = ?
-        ORDER BY date DESC
-    ''', (user_id,))
-    transactions = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    
-    # 2. Process data in Python using dictionaries
-    from collections import defaultdict
-    import calendar
-    
     now = datetime.now()
-    days_in_month = calendar.monthrange(now.year, now.month)[1]
-    days_passed_in_month = max(now.day, 1)
-    remaining_days_in_month = max(days_in_month - now.day, 1)
-    
-    total_income = 0
-    total_expense = 0
     
-    category_totals = defaultdict(float)
-    daily_totals = defaultdict(float)
-    week_totals = {'Monday': 0, 'Tuesday': 0, 'Wednesday': 0, 'Thursday': 0, 'Friday': 0, 'Saturday': 0, 'Sunday': 0}
+    # 1. Aggregate the user's history in SQL (grouped queries over daily rollups)
+    first_day = ledger.month_start(now)
+    agg = analytics_cache.get_or_compute(
+        conn, user_id, f'insights:{first_day}',
+        lambda: ledger.fetch_insights_aggregates(conn, user_id, first_day))
     
-    current_month_prefix = f"{now.year}-{now.month:02d}"
+    total_income = ledger.from_paise(agg['income'])
+    total_expense = ledger.from_paise(agg['expense'])
+    weekend_expense = ledger.from_paise(agg['weekend_expense'])
+    food_expense = ledger.from_paise(agg['food_expense'])
+    recent_transactions_count = agg['month_count']
     
-    current_month_expense = 0
-    weekend_expense = 0
-    food_expense = 0
-    recent_transactions_count = 0
-    
-    for t in transactions:
-        amount = t['amount']
-        t_date = t['date']
-        
-        if t['type'] == 'income':
-            total_income += amount
-        else:
-            total_expense += amount
-            category_totals[t['category']] += amount
-            daily_totals[t_date] += amount
-            
-            try:
-                dt = datetime.strptime(t_date, '%Y-%m-%d')
-                day_name = dt.strftime('%A')
-                if day_name in week_totals:
-                    week_totals[day_name] += amount
-                
-                if day_name in ['Saturday', 'Sunday']:
-                    weekend_expense += amount
-            except ValueError:
-                pass
-                
-            if t['category'] == 'Food':
-                food_expense += amount
-                
-            if t_date.startswith(current_month_prefix):
-                current_month_expense += amount
-                recent_transactions_count += 1
+    category_totals = {category: total for category, total in agg['categories']}
+    week_totals = {name: ledger.from_paise(v) for name, v in zip(ledger.WEEKDAY_NAMES, agg['weekdays'])}
                 
     category_labels = list(category_totals.keys())
-    category_values = list(category_totals.values())
+    category_values = [ledger.from_paise(v) for v in category_totals.values()]
     
-    sorted_dates = sorted(daily_totals.keys())[-30:] # Limit to 30 days for clarity
-    daily_labels = sorted_dates
-    daily_values = [daily_totals[d] for d in sorted_dates]
+    daily_labels = [ledger.from_day(d) for d, _ in agg['daily']]
+    daily_values = [ledger.from_paise(v) for _, v in agg['daily']]
     
     week_labels = list(week_totals.keys())
     week_values = list(week_totals.values())
     
-    # --- FINANCIAL SURVIVAL PREDICTION ---
-    current_balance = max(0, total_income - total_expense)
-    average_daily_spend = current_month_expense / days_passed_in_month if days_passed_in_month > 0 else 0
-    
-    if average_daily_spend > 0:
-        survival_days = int(round(current_balance / average_daily_spend))
-    else:
-        survival_days = 999
-        
-    if survival_days < remaining_days_in_month:
+    # --- FINANCIAL SURVIVAL PREDICTION (same month metrics as the dashboard) ---
+    metrics = get_month_metrics(conn, user_id, now)
+    survival_days = metrics.days_to_zero
+    survival_color = metrics.status
+    if survival_color == "danger":
         survival_message = f"⚠ You will run out of money in {survival_days} days"
-        survival_color = "danger"
-    elif survival_days <= remaining_days_in_month + 3:
+    elif survival_color == "warning":
         survival_message = "⚠ You are cutting it close for the month"
-        survival_color = "warning"
     else:
         survival_message = "✓ You are safe for the rest of the month"
-        survival_color = "success"
 
-    # --- BEHAVIOUR DETECTION PANEL ---
-    behaviour_insights = []
-    if category_totals:
-        highest_cat = max(category_totals, key=category_totals.get)
-        behaviour_insights.append(f"Most of your money is going to {highest_cat}.")
-        
-    if sum(week_totals.values()) > 0:
-        highest_day = max(week_totals, key=week_totals.get)
-        behaviour_insights.append(f"You spend the most on {highest_day}s.")
-        
-    behaviour_insights.append(f"You made {recent_transactions_count} transactions recently.")
-    behaviour_insights.append(f"Average daily spend is ₹{int(average_daily_spend)}.")
-
-    # --- SMART ADVICE ENGINE ---
-    smart_rules = []
-    if total_expense > 0:
-        if (food_expense / total_expense) > 0.40:
-            savings = int(food_expense * 0.3)
-            smart_rules.append(f"🍔 Cooking at home could save you ₹{savings} this month.")
-        if (weekend_expense / total_expense) > 0.30:
-            smart_rules.append("⚠️ High weekend spending detected. Carefully plan weekend outings.")
-            
-    if recent_transactions_count > 15:
-        smart_rules.append("🛍️ Frequent micro-spending detected. Try consolidating purchases.")
-
-    if not smart_rules:
-        smart_rules.append("✨ Your spending habits are healthy! Keep it up.")
-
-    # --- FINANCIAL STABILITY SCORE ---
-    if total_income > 0:
-        savings_ratio = current_balance / total_income
-        expense_ratio = total_expense / total_income
-    else:
-        savings_ratio = 0
-        expense_ratio = 1
-        
-    score = 50 + (savings_ratio * 30) - (expense_ratio * 20)
-    
-    if survival_days >= remaining_days_in_month:
-        score += 20
-    else:
-        score -= 20 * (1 - (survival_days / remaining_days_in_month))
-        
-    financial_stability_score = max(0, min(100, int(score)))
+    # --- BEHAVIOUR DETECTION PANEL + SMART ADVICE ENGINE (advice.py rules) ---
+    messages = advice.RULESET.evaluate(advice.features(
+        expense_total=total_expense,
+        food_expense=food_expense,
+        food_share=advice.share(food_expense, total_expense),
+        weekend_share=advice.share(weekend_expense, total_expense),
+        month_txns=recent_transactions_count,
+        avg_daily_spend=metrics.avg_daily_spend,
+        highest_category=max(category_totals, key=category_totals.get) if category_totals else None,
+        highest_day=max(week_totals, key=week_totals.get) if sum(week_totals.values()) > 0 else None,
+    ), groups=('behaviour', 'advice'))
+    behaviour_insights = messages['behaviour']
+    smart_rules = messages['advice']
 
     # --- NO-SPEND STREAK ---
-    from predictions import calculate_streak
-    streak = calculate_streak(transactions)
+    streak = get_streak(conn, user_id, now)
 
     return render_template('insights.html',
         income_total=total_income,
@@ -429,14 +389,13 @@ def insights():
         daily_values=daily_values,
         weekday_labels=week_labels,
         weekday_values=week_values,
-        raw_transactions=transactions,
         survival_days=survival_days,
         survival_message=survival_message,
         survival_color=survival_color,
-        remaining_days_in_month=remaining_days_in_month,
+        remaining_days_in_month=metrics.days_remaining,
         behaviour_insights=behaviour_insights,
         smart_rules=smart_rules,
-        financial_stability_score=financial_stability_score,
+        financial_stability_score=metrics.stability_score,
         streak=streak
     )
 
@@ -446,28 +405,32 @@ def add_transaction():
         return redirect(url_for('login'))
         
     amount_str = request.form.get('amount')
-    try:
-        amount = float(amount_str) if amount_str else 0.0
-    except ValueError:
-        amount = 0.0
+    amount = _parse_price(amount_str) if amount_str else 0.0
         
     category = request.form.get('category')
     t_type = request.form.get('type')
     date_val = request.form.get('date')
     description = request.form.get('description', '')
     
+    try:
+        day = ledger.to_day(date_val)
+    except (TypeError, ValueError):
+        day = ledger.today()
+    
     if amount > 0:
         conn = get_db_connection()
         try:
-            conn.execute('''
-                INSERT INTO transactions (user_id, amount, category, type, description, date)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (session['user_id'], amount, category, t_type, description, date_val))
+            ledger.insert_transaction(conn, session['user_id'], amount, category, t_type, description, day)
+            if t_type == 'expense':
+                merchant_index.learn(conn, session['user_id'], [(description, category)])
             conn.commit()
+            notify_write(conn, session['user_id'], transaction={
+                'amount': amount, 'category': category, 'description': description,
+                'date': ledger.from_day(day), 'type': t_type,
+            })
         except Exception as e:
+            conn.rollback()
             print(f"Error adding transaction: {e}")
-        finally:
-            conn.close()
             
     return redirect(url_for('dashboard'))
 
@@ -478,145 +441,114 @@ def api_quick_add():
         return jsonify({'error': 'Unauthorized'}), 401
         
     data = request.json
-    amount = float(data.get('amount', 0))
-    description = data.get('description', '')
+    amount = _parse_price(data.get('amount', 0))
+    description = data.get('description') or ''
     
     if amount <= 0:
         return jsonify({'error': 'Invalid amount'}), 400
+    if not isinstance(description, str):
+        return jsonify({'error': 'Invalid description'}), 400
         
-    category = auto_categorize(description)
-    date_val = datetime.now().strftime('%Y-%m-%d')
     user_id = session['user_id']
-    
     conn = get_db_connection()
-    conn.execute('''
-        INSERT INTO transactions (user_id, amount, category, type, description, date)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (user_id, amount, category, 'expense', description, date_val))
+    category = auto_categorize(description, conn, user_id)
+    day = ledger.today()
+    date_val = ledger.from_day(day)
+    transaction = {
+        'amount': amount,
+        'category': category,
+        'description': description,
+        'date': date_val,
+        'type': 'expense'
+    }
+    
+    if quick_add_queue is not None:
+        # Committed by the write-behind thread within WRITE_BEHIND_MS
+        try:
+            quick_add_queue.submit((user_id, ledger.to_paise(amount), category, 'expense', description, day))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({
+            'success': True,
+            'queued': True,
+            'transaction': transaction
+        })
+    
+    ledger.insert_transaction(conn, user_id, amount, category, 'expense', description, day)
     conn.commit()
-    conn.close()
+    notify_write(conn, user_id, transaction=transaction)
     
     return jsonify({
         'success': True,
-        'transaction': {
-            'amount': amount,
-            'category': category,
-            'description': description,
-            'date': date_val,
-            'type': 'expense'
-        }
+        'transaction': transaction
     })
 
+@app.route('/api/import', methods=['POST'])
+def api_import():
+    """Bulk import transactions from an uploaded CSV or JSONL file."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+        
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'error': 'No file uploaded'}), 400
+        
+    user_id = session['user_id']
+    conn = get_db_connection()
+    try:
+        summary = import_transactions(
+            conn, user_id, upload.stream, upload.filename,
+            categorize=lambda description: auto_categorize(description, conn, user_id),
+            learn=lambda pairs: merchant_index.learn(conn, user_id, pairs))
+    except Exception:
+        # Earlier batches may already be committed; drop only the open one
+        conn.rollback()
+        notify_write(conn, user_id)
+        raise
+    if summary['accepted']:
+        notify_write(conn, user_id)
+    
+    if 'error' in summary:
+        # Stopped partway: 'accepted' rows are stored, so a retry should skip them
+        return jsonify({'success': False, **summary}), 400
+    return jsonify({'success': True, **summary})
+
 @app.route('/check_budget', methods=['POST'])
 def check_budget():
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
         
     data = request.json
-    amount = float(data.get('amount', 0))
+    try:
+        amount = ledger.check_amount(data.get('amount', 0))
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'Invalid amount'}), 400
     user_id = session['user_id']
     conn = get_db_connection()
-    user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
-    
-    now = datetime.now()
-    first_day = f"{now.year}-{now.month:02d}-01"
-    
-    cursor = conn.execute("SELECT SUM(amount) as total FROM transactions WHERE user_id = ? AND date >= ? AND type = 'expense'", (user_id, first_day))
-    row = cursor.fetchone()
-    total_expense = row['total'] if row['total'] else 0
     
-    cursor = conn.execute("SELECT SUM(amount) as total FROM transactions WHERE user_id = ? AND date >= ? AND type = 'income'", (user_id, first_day))
-    row = cursor.fetchone()
-    total_income = row['total'] if row['total'] else 0
-    
-    import calendar
-    days_in_month = calendar.monthrange(now.year, now.month)[1]
-    days_remaining_in_month = max(days_in_month - now.day, 1)
-    
-    # Use the same real balance model here for consistency
-    current_balance = total_income - total_expense
-    balance = max(current_balance, 0)
-    
-    safe_daily_spend = balance / max(days_remaining_in_month, 1)
-    conn.close()
-    
-    if amount <= safe_daily_spend:
+    # Called as the user types: served from the safe-spend cache, which
+    # matches the dashboard's MonthMetrics.safe_daily_spend
+    if amount <= safe_spend_cache.get(conn, user_id, datetime.now()):
         return jsonify({'status': 'safe', 'message': 'Safe to spend'})
     else:
         return jsonify({'status': 'danger', 'message': 'Not recommended — will affect your monthly survival'})
 
 
-@app.route('/api/should_i_buy', methods=['POST'])
-def should_i_buy():
-    """
-    Core decision engine: given an item and price, simulate the month
-    with and without the purchase and return a verdict and metrics.
-    """
-    if 'user_id' not in session:
-        return jsonify({'error': 'Not logged in'}), 401
-
-    data = request.get_json(silent=True) or {}
-    item_name = (data.get('item_name') or '').strip()
-
-    # Robust price parsing
-    try:
-        price = float(data.get('price', 0))
-    except (TypeError, ValueError):
-        price = 0.0
-
-    if price <= 0:
-        return jsonify({'error': 'Invalid price'}), 400
-
-    user_id = session['user_id']
-    conn = get_db_connection()
-
-    now = datetime.now()
-    first_day = f"{now.year}-{now.month:02d}-01"
-
-    cursor = conn.execute(
-        '''
-        SELECT amount, type, category, date
-        FROM transactions
-        WHERE user_id = ? AND date >= ?
-        ORDER BY date DESC
-        ''',
-        (user_id, first_day),
-    )
-    month_transactions = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-
-    total_income = sum(t['amount'] for t in month_transactions if t['type'] == 'income')
-    total_expense = sum(t['amount'] for t in month_transactions if t['type'] == 'expense')
-
-    import calendar
-
-    days_in_month = calendar.monthrange(now.year, now.month)[1]
-    days_passed = max(now.day, 1)
-    days_remaining = max(days_in_month - now.day, 1)
-
-    current_balance = total_income - total_expense
-    available_balance = max(current_balance, 0)
-
-    avg_daily_spend = total_expense / days_passed if days_passed > 0 else 0.0
-
-    # Survival days before purchase
-    if avg_daily_spend > 0:
-        current_survival_days = current_balance > 0 and (current_balance / avg_daily_spend) or 0
-    else:
-        current_survival_days = 999 if current_balance > 0 else 0
+def evaluate_purchase(metrics, price):
+    """Verdict and post-purchase metrics for spending ``price`` now, given MonthMetrics."""
+    current_balance = metrics.current_balance
+    avg_daily_spend = metrics.avg_daily_spend
+    days_remaining = metrics.days_remaining
 
     # Simulate purchase
     post_balance = current_balance - price
     post_available_balance = max(post_balance, 0)
 
-    if avg_daily_spend > 0:
-        post_survival_days = post_available_balance > 0 and (post_available_balance / avg_daily_spend) or 0
-    else:
-        post_survival_days = 999 if post_balance > 0 else 0
+    post_survival_days = survival_days(post_balance, avg_daily_spend)
 
     # Stability scores before / after
-    stability_before = compute_stability_score(total_income, total_expense, available_balance)
-    stability_after = compute_stability_score(total_income, total_expense, post_available_balance)
+    stability_before = metrics.stability_score
+    stability_after = compute_stability_score(metrics.total_income, metrics.total_expense, post_available_balance)
     stability_delta = stability_after - stability_before
 
     # Risk classification
@@ -644,27 +576,13 @@ def should_i_buy():
     else:
         runout_message = "This purchase does not make you run out before month end."
 
-    # Safe price suggestion – keep survival_days >= days_remaining
-    if avg_daily_spend > 0:
-        safe_price_raw = current_balance - (avg_daily_spend * days_remaining)
-        safe_price_raw = max(0.0, safe_price_raw)
-    else:
-        safe_price_raw = max(0.0, current_balance)
-
-    if safe_price_raw <= 0:
-        safe_price = 0
-    else:
-        # Round down to nearest 50 for a friendly suggestion
-        safe_price = math.floor(safe_price_raw / 50.0) * 50.0
-
-    response = {
-        "item_name": item_name or "Planned purchase",
+    return {
         "price": price,
         "current_balance": current_balance,
         "post_balance": post_balance,
-        "current_safe_daily": available_balance / days_remaining if days_remaining > 0 else available_balance,
-        "post_safe_daily": post_available_balance / days_remaining if days_remaining > 0 else post_available_balance,
-        "current_survival_days": current_survival_days,
+        "current_safe_daily": metrics.safe_daily_spend,
+        "post_safe_daily": post_available_balance / days_remaining,
+        "current_survival_days": metrics.survival_days,
         "post_survival_days": post_survival_days,
         "stability_score_before": stability_before,
         "stability_score_after": stability_after,
@@ -672,60 +590,252 @@ def should_i_buy():
         "risk_level": risk_level,
         "verdict": verdict,
         "runout_message": runout_message,
-        "safe_price": safe_price,
+        "safe_price": metrics.safe_price,
         "days_remaining": days_remaining,
         "days_short": days_short,
     }
 
+
+def _parse_price(value):
+    """Rupee amount from a request field; 0.0 if it isn't a number in ledger's range."""
+    try:
+        return ledger.check_amount(value)
+    except (TypeError, ValueError, OverflowError):
+        return 0.0
+
+
+@app.route('/api/should_i_buy', methods=['POST'])
+def should_i_buy():
+    """
+    Core decision engine: given an item and price, simulate the month
+    with and without the purchase and return a verdict and metrics.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    data = request.get_json(silent=True) or {}
+    item_name = (data.get('item_name') or '').strip()
+
+    # Robust price parsing
+    price = _parse_price(data.get('price', 0))
+
+    if price <= 0:
+        return jsonify({'error': 'Invalid price'}), 400
+
+    user_id = session['user_id']
+    conn = get_db_connection()
+
+    now = datetime.now()
+    metrics = get_month_metrics(conn, user_id, now)
+    response = {"item_name": item_name or "Planned purchase", **evaluate_purchase(metrics, price)}
+
+    # Simulation mode: bootstrap this month's daily spend into many
+    # month-end trajectories instead of relying on the average alone
+    if data.get('mode') == 'simulate' or request.args.get('mode') == 'simulate':
+        try:
+            n_paths = int(data.get('paths', forecasting.SIMULATION_PATHS))
+        except (TypeError, ValueError, OverflowError):
+            n_paths = forecasting.SIMULATION_PATHS
+        n_paths = min(max(n_paths, 100), MAX_SIMULATION_PATHS)
+        history = forecasting.load_daily_expenses(
+            conn, [user_id], ledger.month_start(now), ledger.to_day(now))[0]
+        simulation = forecasting.simulate_month_end(
+            metrics.current_balance, history, metrics.days_remaining, price, n_paths)
+        simulation['paths'] = n_paths
+        response["simulation"] = simulation
+
     return jsonify(response)
 
+@app.route('/api/should_i_buy/batch', methods=['POST'])
+def should_i_buy_batch():
+    """
+    Compare many purchases at once. Body:
+      {"items": [{"item_name": "Shoes", "price": 1200}, ...],
+       "bundles": [[0, 1], ...],      # optional, indexes into items
+       "max_bundle_size": 2}          # optional, every combination up to this size
+    The month state is loaded once and every item and bundle is evaluated
+    against it; results come back in request order, bundles after items.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(items) > MAX_BATCH_CANDIDATES:
+        return jsonify({'error': f'At most {MAX_BATCH_CANDIDATES} items per request'}), 400
+
+    names = []
+    prices = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        price = _parse_price(item.get('price', 0))
+        if price <= 0:
+            return jsonify({'error': f'Invalid price for item {index}'}), 400
+        names.append((item.get('item_name') or '').strip() or f"Item {index + 1}")
+        prices.append(price)
+
+    bundles = []
+    for bundle in data.get('bundles') or []:
+        if (not isinstance(bundle, list) or not bundle
+                or not all(isinstance(i, int) and 0 <= i < len(items) for i in bundle)):
+            return jsonify({'error': 'bundles must be lists of item indexes'}), 400
+        bundles.append(tuple(sorted(set(bundle))))
+    try:
+        max_bundle_size = min(int(data.get('max_bundle_size') or 0), len(items))
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'Invalid max_bundle_size'}), 400
+    for size in range(2, max_bundle_size + 1):
+        bundles.extend(itertools.combinations(range(len(items)), size))
+        if len(items) + len(bundles) > MAX_BATCH_CANDIDATES:
+            return jsonify({'error': f'At most {MAX_BATCH_CANDIDATES} candidates per request'}), 400
+    bundles = list(dict.fromkeys(bundles))
+    if len(items) + len(bundles) > MAX_BATCH_CANDIDATES:
+        return jsonify({'error': f'At most {MAX_BATCH_CANDIDATES} candidates per request'}), 400
+
+    conn = get_db_connection()
+    metrics = get_month_metrics(conn, session['user_id'], datetime.now())
+
+    results = [
+        {"item_name": name, **evaluate_purchase(metrics, price)}
+        for name, price in zip(names, prices)
+    ]
+    bundle_results = [
+        {
+            "items": list(bundle),
+            "item_name": " + ".join(names[i] for i in bundle),
+            **evaluate_purchase(metrics, sum(prices[i] for i in bundle)),
+        }
+        for bundle in bundles
+    ]
+
+    return jsonify({
+        "current_balance": metrics.current_balance,
+        "days_remaining": metrics.days_remaining,
+        "safe_price": metrics.safe_price,
+        "items": results,
+        "bundles": bundle_results,
+    })
+
 @app.route('/smart_import', methods=['POST'])
 def smart_import():
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
         
     data = request.json
-    message = data.get('message', '').lower()
-    
-    # Regex to find amount (e.g., Rs. 500, ₹ 100, INR 50)
-    amount_match = re.search(r'(?:rs\.?|₹|inr)\s*(\d+(?:\.\d+)?)', message)
-    amount = float(amount_match.group(1)) if amount_match else 0
-    
-    category = 'Other'
-    t_type = 'expense'
-    
-    # Keyword based categorization
-    if 'swiggy' in message or 'zomato' in message or 'food' in message or 'lunch' in message or 'tea' in message:
-        category = 'Food'
-    elif 'bus' in message or 'uber' in message or 'ola' in message or 'travel' in message:
-        category = 'Travel'
-    elif 'recharge' in message or 'jio' in message or 'airtel' in message or 'bill' in message:
-        category = 'Bills'
-    elif 'scholarship' in message or 'salary' in message or 'received' in message or 'credited' in message:
-        category = 'Income'
-        t_type = 'income'
+    message = data.get('message', '')
+    parsed = sms_parser.parse_message(message)
         
-    if amount > 0:
+    if parsed:
         conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO transactions (user_id, amount, category, type, description, date)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (session['user_id'], amount, category, t_type, f"Smart Import: {message[:20]}...", datetime.now().strftime('%Y-%m-%d')))
+        ledger.insert_transaction(conn, session['user_id'], parsed['amount'], parsed['category'], parsed['type'], parsed['description'], ledger.today())
+        # Remember the message so a later batch import of the same SMS skips it
+        conn.execute('INSERT OR IGNORE INTO imported_messages (user_id, message_hash) VALUES (?, ?)',
+                     (session['user_id'], sms_parser.message_hash(message)))
         conn.commit()
-        conn.close()
+        notify_write(conn, session['user_id'], transaction={
+            'amount': parsed['amount'], 'category': parsed['category'], 'description': parsed['description'],
+            'date': ledger.from_day(ledger.today()), 'type': parsed['type'],
+        })
         
         return jsonify({
             'success': True, 
-            'amount': amount, 
-            'category': category, 
-            'type': t_type
+            'amount': parsed['amount'], 
+            'category': parsed['category'], 
+            'type': parsed['type']
         })
     else:
         return jsonify({'success': False, 'error': 'Could not detect amount'})
 
+@app.route('/smart_import/batch', methods=['POST'])
+def smart_import_batch():
+    """
+    Import many SMS messages at once: a JSON body {"messages": [...]} or a
+    plain-text body with one message per line. Messages already imported
+    (here or through /smart_import) are reported as duplicates and blank or
+    non-text entries as skipped; everything is written in a single
+    transaction.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+        
+    if request.is_json:
+        messages = (request.get_json(silent=True) or {}).get('messages')
+        if not isinstance(messages, list):
+            return jsonify({'error': 'messages must be a list'}), 400
+    else:
+        messages = request.get_data(as_text=True).splitlines()
+    
+    user_id = session['user_id']
+    conn = get_db_connection()
+    hashes = {index: sms_parser.message_hash(m) for index, m in enumerate(messages)
+              if isinstance(m, str) and m.strip()}
+    seen = set()
+    digests = list(hashes.values())
+    for i in range(0, len(digests), 500):
+        chunk = digests[i:i + 500]
+        cursor = conn.execute(
+            f"SELECT message_hash FROM imported_messages WHERE user_id = ? AND message_hash IN ({','.join('?' * len(chunk))})",
+            (user_id, *chunk))
+        seen.update(row['message_hash'] for row in cursor)
+    
+    today = ledger.today()
+    rows = []
+    results = []
+    for index, message in enumerate(messages):
+        digest = hashes.get(index)
+        if digest is None:
+            results.append({'index': index, 'status': 'skipped'})
+            continue
+        if digest in seen:
+            results.append({'index': index, 'status': 'duplicate'})
+            continue
+        parsed = sms_parser.parse_message(message)
+        if parsed is None:
+            results.append({'index': index, 'status': 'no_amount'})
+            continue
+        seen.add(digest)
+        # A concurrent import of the same message may have claimed it since
+        # the lookup above; the loser reports a duplicate
+        claimed = conn.execute('INSERT OR IGNORE INTO imported_messages (user_id, message_hash) VALUES (?, ?)',
+                               (user_id, digest)).rowcount
+        if not claimed:
+            results.append({'index': index, 'status': 'duplicate'})
+            continue
+        rows.append((user_id, ledger.to_paise(parsed['amount']), parsed['category'], parsed['type'], parsed['description'], today))
+        results.append({'index': index, 'status': 'imported', 'amount': parsed['amount'],
+                        'category': parsed['category'], 'type': parsed['type']})
+    
+    if rows:
+        ledger.insert_transactions(conn, rows)
+    conn.commit()
+    if rows:
+        notify_write(conn, user_id, imported=len(rows))
+    
+    return jsonify({
+        'success': True,
+        'imported': len(rows),
+        'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+        'failed': sum(1 for r in results if r['status'] == 'no_amount'),
+        'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+        'results': results
+    })
+
+
+# Sunday == 0, as in the chart's weekday series
+CHART_WEEKDAYS = ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+# Days of spending the balance forecast is projected from
+FORECAST_LOOKBACK = forecasting.LOOKBACK_DAYS
 
 @app.route('/api/chart_data')
 def chart_data():
+    """
+    All dashboard chart series from one rollup read. Responses carry an
+    ETag built from the user's data_version, so an unchanged poll is a 304
+    without running the query. ?since=YYYY-MM-DD limits daily_spending to
+    days from that date on, for charts that patch themselves.
+    """
     if 'user_id' not in session:
         return jsonify({'error': 'Not logged in'}), 401
         
@@ -733,77 +843,144 @@ def chart_data():
     conn = get_db_connection()
     
     now = datetime.now()
-    first_day = f"{now.year}-{now.month:02d}-01"
-    
-    # Expense by category (Pie Chart)
-    cursor = conn.execute('''
-        SELECT category, SUM(amount) as total 
-        FROM transactions 
-        WHERE user_id = ? AND date >= ? AND type = 'expense'
-        GROUP BY category
-    ''', (user_id, first_day))
-    category_data = cursor.fetchall()
-    
-    # Daily spending (Line Chart)
-    cursor = conn.execute('''
-        SELECT date, SUM(amount) as total 
-        FROM transactions 
-        WHERE user_id = ? AND date >= ? AND type = 'expense'
-        GROUP BY date
-        ORDER BY date
-    ''', (user_id, first_day))
-    daily_data = cursor.fetchall()
-    
-    # Income vs Expense
-    cursor = conn.execute('''
-        SELECT type, SUM(amount) as total 
-        FROM transactions 
-        WHERE user_id = ? AND date >= ?
-        GROUP BY type
-    ''', (user_id, first_day))
-    inc_exp_data = cursor.fetchall()
-    
-    # Weekly Spending Pattern (Day of Week)
-    cursor = conn.execute('''
-        SELECT 
-            CASE cast(strftime('%w', date) as integer)
-                WHEN 0 THEN 'Sunday'
-                WHEN 1 THEN 'Monday'
-                WHEN 2 THEN 'Tuesday'
-                WHEN 3 THEN 'Wednesday'
-                WHEN 4 THEN 'Thursday'
-                WHEN 5 THEN 'Friday'
-                WHEN 6 THEN 'Saturday'
-            END as day_of_week,
-            strftime('%w', date) as day_index,
-            SUM(amount) as total 
-        FROM transactions 
-        WHERE user_id = ? AND type = 'expense'
-        GROUP BY day_of_week
-        ORDER BY day_index
-    ''', (user_id,))
-    weekly_pattern_data = cursor.fetchall()
-    
-    conn.close()
+    today = ledger.to_day(now)
+    first_day = ledger.month_start(now)
+
+    since = request.args.get('since')
+    since_day = None
+    if since:
+        try:
+            since_day = ledger.to_day(since)
+        except ValueError:
+            return jsonify({'error': 'since must be YYYY-MM-DD'}), 400
+
+    # Month boundaries and the forecast depend on the date as well as the data
+    version = get_data_version(conn, user_id)
+    etag = f"{user_id}-{version}-{today}" + (f"-{since_day}" if since_day is not None else "")
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    lookback_start = today - (FORECAST_LOOKBACK - 1)
+    series = ledger.fetch_chart_series(conn, user_id, first_day, min(first_day, lookback_start))
+    daily_totals = dict(series['daily'])
+    type_totals = dict(series['type'])
+
+    daily = [(day, total) for day, total in series['daily'] if day >= first_day]
+    if since_day is not None:
+        daily = [(day, total) for day, total in daily if day >= since_day]
+
+    # Balance forecast to month end, one curve per projection method,
+    # projected from the last four weeks of spending
+    import calendar
+    days_remaining = max(calendar.monthrange(now.year, now.month)[1] - now.day, 1)
+    balance = max(ledger.from_paise(type_totals.get('income', 0) - type_totals.get('expense', 0)), 0)
+    lookback = [[ledger.from_paise(daily_totals.get(day, 0)) for day in range(lookback_start, today + 1)]]
+    forecast = {
+        method: forecasting.project_balances(
+            balance, lookback, days_remaining, method, first_weekday=ledger.weekday(lookback_start)
+        )[0].tolist()
+        for method in forecasting.METHODS
+    }
     
-    return jsonify({
+    response = jsonify({
+        'version': version,
+        'since': ledger.from_day(since_day) if since_day is not None else None,
         'expense_categories': {
-            'labels': [row['category'] for row in category_data],
-            'data': [row['total'] for row in category_data]
+            'labels': [category for category, _ in series['category']],
+            'data': [ledger.from_paise(total) for _, total in series['category']]
         },
         'daily_spending': {
-            'labels': [row['date'] for row in daily_data],
-            'data': [row['total'] for row in daily_data]
+            'labels': [ledger.from_day(day) for day, _ in daily],
+            'data': [ledger.from_paise(total) for _, total in daily]
         },
         'income_vs_expense': {
-            'labels': [row['type'].capitalize() for row in inc_exp_data],
-            'data': [row['total'] for row in inc_exp_data]
+            'labels': [t_type.capitalize() for t_type, _ in series['type']],
+            'data': [ledger.from_paise(total) for _, total in series['type']]
         },
         'weekly_pattern': {
-            'labels': [row['day_of_week'] for row in weekly_pattern_data],
-            'data': [row['total'] for row in weekly_pattern_data]
+            'labels': [CHART_WEEKDAYS[index] for index, _ in series['weekday']],
+            'data': [ledger.from_paise(total) for _, total in series['weekday']]
+        },
+        'balance_forecast': {
+            'labels': [f"Day {now.day + i}" for i in range(1, days_remaining + 1)],
+            **forecast
         }
     })
+    response.set_etag(etag, weak=True)
+    # Browsers keep the body but revalidate on every poll
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/window_stats')
+def window_stats():
+    """Spending insights and daily series for ?window=7|30|90 days."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    window = get_insights_window(request.args)
+    today = ledger.today()
+    rolling = rolling_windows.get(get_db_connection(), session['user_id'], today)
+    return jsonify({
+        'window': window,
+        'insights': rolling.insights(window),
+        'daily': {
+            'labels': [ledger.from_day(d) for d in range(today - window, today + 1)],
+            'data': [ledger.from_paise(paise) for paise in rolling.daily(window)],
+        },
+    })
+
+@app.route('/api/events')
+def live_updates():
+    """
+    Server-Sent Events stream of the user's live updates: an 'update' event
+    after every write, with keep-alive comments in between.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    stream = live_events.stream(session['user_id'], LIVE_STREAM_SECONDS)
+    if stream is None:
+        # Every stream slot of this worker is taken; the page polls instead
+        return jsonify({'error': 'Too many live streams', 'poll': url_for('live_state')}), 503
+    return app.response_class(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # don't let a proxy buffer the stream
+    })
+
+@app.route('/api/live_state')
+def live_state():
+    """Polling fallback for /api/events: the current live figures."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    response = jsonify(get_live_state(get_db_connection(), session['user_id']))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/analytics')
+def user_analytics():
+    """
+    The user's precomputed analytics from the nightly pipeline; when the
+    stored row is stale it is recomputed and stored in its place.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    user_id = session['user_id']
+    conn = get_db_connection()
+    payload = nightly.fetch_analytics(conn, user_id)
+    precomputed = payload is not None
+    if payload is None:
+        version = get_data_version(conn, user_id)
+        payload = nightly.compute_user_analytics(conn, user_id, datetime.now())
+        nightly.store_analytics(conn, [(user_id, version, payload)])
+        conn.commit()
+    return jsonify({**payload, 'precomputed': precomputed})
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    """Hit/miss/eviction counters of this worker's analytics cache."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    return jsonify({**analytics_cache.stats(), 'safe_spend': safe_spend_cache.stats()})
 
 if __name__ == '__main__':
     app.run(host="0.0.0.0", port=10000)
@@ -0,0 +1,143 @@
+"""
+/check_budget latency, the route called as the user types.
+
+    python benchmarks/bench_check_budget.py [threads ...]      (default 1 4 16)
+
+First times the view function alone, 3,000 calls on a cache hit and 3,000
+with data_version bumped before each call (a miss). Then drives the whole
+request through Flask from several client threads. The users rotate over
+16 accounts, and each thread writes once every 200 checks. For each
+thread count it prints requests a second, the server's CPU and wall time
+per request, and the client's p99. On one core the wall time includes
+GIL and scheduler queueing; the CPU time is the handler's own cost.
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['DATABASE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench_check_budget.db')
+
+import app
+import db
+import ledger
+
+USERS = 16
+TRANSACTIONS = 5000  # per user
+REQUESTS = 4000  # per thread count, split across the threads
+WRITE_EVERY = 200
+
+
+def pct(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def login(user_id):
+    client = app.app.test_client()
+    client.post('/register', data={'username': f'bench{user_id}', 'password': 'bench'})
+    client.post('/login', data={'username': f'bench{user_id}', 'password': 'bench'})
+    return client
+
+
+def seed(conn):
+    rnd = random.Random(3)
+    today = ledger.today()
+    rows = []
+    for (user_id,) in conn.execute('SELECT id FROM users').fetchall():
+        rows += [(user_id, 5000000, 'Income', 'income', 'salary', today - 30 * k) for k in range(12)]
+        rows += [
+            (user_id, rnd.randint(500, 60000), rnd.choice(('Food', 'Travel', 'Bills')), 'expense', 'bench',
+             today - rnd.randint(0, 365))
+            for _ in range(TRANSACTIONS)
+        ]
+    ledger.insert_transactions(conn, rows)
+    conn.commit()
+
+
+def bench_view(client, conn):
+    view = app.app.view_functions['check_budget']
+    times = []
+
+    def timed():
+        started = time.perf_counter()
+        try:
+            return view()
+        finally:
+            times.append((time.perf_counter() - started) * 1e6)
+
+    app.app.view_functions['check_budget'] = timed
+    try:
+        for mode in ('hit', 'miss'):
+            times.clear()
+            for _ in range(3000):
+                if mode == 'miss':
+                    conn.execute('UPDATE users SET data_version = data_version + 1 WHERE id = 1')
+                    conn.commit()
+                client.post('/check_budget', json={'amount': 100})
+            times.sort()
+            print(f'view {mode:4}: p50 {pct(times, .5):5.0f}us  p99 {pct(times, .99):5.0f}us')
+    finally:
+        app.app.view_functions['check_budget'] = view
+
+
+def bench_load(clients, threads):
+    wall, cpu, client_times = [], [], []
+    lock = threading.Lock()
+    inner = app.app.wsgi_app
+
+    def timed(environ, start_response):
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            return inner(environ, start_response)
+        finally:
+            if environ['PATH_INFO'] == '/check_budget':
+                wall.append((time.perf_counter() - started) * 1000)
+                cpu.append((time.thread_time() - cpu_started) * 1000)
+
+    def worker(k):
+        client = clients[k % USERS]
+        mine = []
+        for i in range(REQUESTS // threads):
+            if i % WRITE_EVERY == WRITE_EVERY - 1:
+                client.post('/add_transaction', data={
+                    'amount': '10', 'category': 'Food', 'type': 'expense', 'date': time.strftime('%Y-%m-%d'),
+                })
+            started = time.perf_counter()
+            assert client.post('/check_budget', json={'amount': 100 + i % 900}).status_code == 200
+            mine.append((time.perf_counter() - started) * 1000)
+        with lock:
+            client_times.extend(mine)
+
+    app.app.wsgi_app = timed
+    try:
+        workers = [threading.Thread(target=worker, args=(k,)) for k in range(threads)]
+        started = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        app.app.wsgi_app = inner
+    wall.sort()
+    cpu.sort()
+    client_times.sort()
+    print(f'{threads:2d} threads: {len(wall) / elapsed:6.0f} req/s'
+          f'  cpu p50 {pct(cpu, .5):.3f} p99 {pct(cpu, .99):.3f}'
+          f'  wall p50 {pct(wall, .5):.3f} p99 {pct(wall, .99):.3f}'
+          f'  client p99 {pct(client_times, .99):.3f} ms')
+
+
+if __name__ == '__main__':
+    app.app.config['TESTING'] = True
+    clients = [login(user_id) for user_id in range(USERS)]
+    conn = db.connect(app.DATABASE)
+    seed(conn)
+    bench_view(clients[0], conn)
+    for threads in [int(arg) for arg in sys.argv[1:]] or [1, 4, 16]:
+        bench_load(clients, threads)
+    conn.close()
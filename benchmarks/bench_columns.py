@@ -0,0 +1,88 @@
+"""
+Memory of the streak scan over a list of row dicts versus
+ledger.TransactionColumns.
+
+    python benchmarks/bench_columns.py [rows]      (default 50000)
+
+Seeds one user into a scratch database, then runs each variant in a fresh
+interpreter so peak RSS is its own:
+  dicts        every transaction as a ledger.row_to_dict() dict
+  columns      every transaction as TransactionColumns
+  streak_days  what current_streak()'s fallback loads: one (day, type) per
+               active day in the window, via ledger.fetch_streak_days()
+All three must give the same streak.
+"""
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db
+import ledger
+import predictions
+from migrations import migrate
+
+MODES = ('dicts', 'columns', 'streak_days')
+CATEGORIES = ('Food', 'Travel', 'Shopping', 'Others', 'Fees')
+
+
+def seed(path, rows):
+    conn = db.connect(path)
+    migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('bench', 'bench')")
+    rnd = random.Random(1)
+    today = ledger.today()
+    ledger.insert_transactions(conn, [
+        (1, rnd.randint(100, 90000), rnd.choice(CATEGORIES), rnd.choice(('expense', 'expense', 'income')),
+         'some description text', today - rnd.randint(5, 1500))
+        for _ in range(rows)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def measure(path, mode):
+    conn = db.connect(path)
+    today = ledger.today()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    started = time.perf_counter()
+    if mode == 'dicts':
+        data = [ledger.row_to_dict(row) for row in conn.execute(
+            f'SELECT {ledger.TRANSACTION_COLUMNS} FROM transactions WHERE user_id = 1').fetchall()]
+    elif mode == 'columns':
+        data = ledger.TransactionColumns.from_cursor(conn.execute(
+            'SELECT day, amount_paise, type, category FROM transactions WHERE user_id = 1'))
+    else:
+        data = ledger.fetch_streak_days(conn, 1, today)
+    streak = predictions.calculate_streak(data, today)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss  # KiB on Linux
+    print(f'{mode:12} {len(data):>8} rows  peak traced {peak / 1e6:6.1f} MB'
+          f'  peak RSS +{rss / 1024:6.1f} MB  {elapsed * 1000:6.0f} ms  streak {streak}')
+    return streak
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] in MODES:
+        measure(sys.argv[2], sys.argv[1])
+        sys.exit(0)
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    path = os.path.join(tempfile.mkdtemp(), 'bench_columns.db')
+    seed(path, rows)
+    streaks = set()
+    for mode in MODES:
+        out = subprocess.run([sys.executable, __file__, mode, path], capture_output=True, text=True, check=True).stdout
+        print(out, end='')
+        streaks.add(out.rsplit(' ', 1)[1].strip())
+    if len(streaks) != 1:
+        sys.exit(f'streaks differ: {sorted(streaks)}')
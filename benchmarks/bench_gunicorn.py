@@ -0,0 +1,174 @@
+"""
+Load test against a real gunicorn server, one server configuration at a
+time.
+
+    python benchmarks/bench_gunicorn.py [--seconds 10] [--clients 16] [--import-load]
+                                        [config ...]      (default sync gthread)
+
+Configurations (CONFIGS) are sets of environment variables read by
+gunicorn.conf.py and app.py; 'sync' is the single sync worker the
+Procfile used to start. Each run starts gunicorn on a scratch database,
+lets CLIENTS keep-alive clients send a mix of quick_add, check_budget,
+should_i_buy and chart_data for SECONDS (with --import-load, one more
+client loops 20k-row /api/import uploads meanwhile), stops the server and
+prints req/s, p50, p99 and errors.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync', 'WEB_CONCURRENCY': '1'},
+    'gthread': {'WEB_CONCURRENCY': '1'},
+    'gthread-2': {'WEB_CONCURRENCY': '2'},
+    'write-behind': {'WEB_CONCURRENCY': '1', 'QUICK_ADD_WRITE_BEHIND': '1'},
+}
+MIX = (
+    (0.4, 'POST', '/api/quick_add', {'amount': 12, 'description': 'tea'}),
+    (0.6, 'POST', '/check_budget', {'amount': 100}),
+    (0.8, 'POST', '/api/should_i_buy', {'price': 700}),
+    (1.0, 'GET', '/api/chart_data', None),
+)
+QUICK_ADD_ONLY = ((1.0, 'POST', '/api/quick_add', {'amount': 12, 'description': 'tea'}),)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(config, database):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), DATABASE_PATH=database, **CONFIGS[config])
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/login')
+            connection.getresponse().read()
+            return server, port
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f'gunicorn ({config}) did not start')
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def login(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.request('POST', '/login', 'username=bench&password=bench',
+                       {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    return connection, response.getheader('Set-Cookie').split(';')[0]
+
+
+def load(port, clients, seconds, mix=MIX, import_load=False):
+    """Drive the server; returns (requests, latencies in ms sorted, errors, imports)."""
+    latencies, imports = [], []
+    errors = [0]
+    lock = threading.Lock()
+    end = time.time() + seconds
+
+    def client(seed):
+        rnd = random.Random(seed)
+        connection, cookie = login(port)
+        mine, failed = [], 0
+        while time.time() < end:
+            pick = rnd.random()
+            _, method, path, body = next(entry for entry in mix if pick < entry[0])
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, json.dumps(body) if body is not None else None,
+                                   {'Cookie': cookie, 'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                failed += response.status != 200
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection, cookie = login(port)
+            mine.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    def importer():
+        connection, cookie = login(port)
+        payload = ''.join(json.dumps({'amount': 5, 'description': 'bulk tea'}) + '\n' for _ in range(20000))
+        boundary = 'benchboundary'
+        body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bulk.jsonl"\r\n\r\n'
+                f'{payload}\r\n--{boundary}--\r\n').encode()
+        while time.time() < end:
+            connection.request('POST', '/api/import', body, {
+                'Cookie': cookie, 'Content-Type': f'multipart/form-data; boundary={boundary}'})
+            response = connection.getresponse()
+            response.read()
+            imports.append(response.status)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    if import_load:
+        threads.append(threading.Thread(target=importer))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return len(latencies), latencies, errors[0], imports
+
+
+def run(config, clients, seconds, mix=MIX, import_load=False):
+    with tempfile.TemporaryDirectory() as scratch:
+        server, port = start_server(config, os.path.join(scratch, 'bench_gunicorn.db'))
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            connection.request('POST', '/register', 'username=bench&password=bench',
+                               {'Content-Type': 'application/x-www-form-urlencoded'})
+            connection.getresponse().read()
+            count, latencies, errors, imports = load(port, clients, seconds, mix, import_load)
+        finally:
+            stop_server(server)
+    if not latencies:
+        print(f'{config:13} no requests completed')
+        return
+    print(f'{config:13} {count / seconds:7.1f} req/s  p50 {latencies[len(latencies) // 2]:7.1f} ms'
+          f'  p99 {latencies[int(len(latencies) * .99)]:7.1f} ms  errors {errors}'
+          + (f'  imports {len(imports)}' if import_load else ''))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test gunicorn configurations.')
+    parser.add_argument('configs', nargs='*', default=['sync', 'gthread'], choices=sorted(CONFIGS))
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--import-load', action='store_true', help='loop 20k-row imports alongside')
+    parser.add_argument('--quick-add-only', action='store_true', help='send only /api/quick_add')
+    args = parser.parse_args(argv)
+    mix = QUICK_ADD_ONLY if args.quick_add_only else MIX
+    for config in args.configs:
+        run(config, args.clients, args.seconds, mix, args.import_load)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Peak traced memory per request for one user with a large history.
+
+    python benchmarks/bench_memory.py [rows ...]      (default 100000 1000000)
+
+Each size is seeded once into a scratch database under the temp directory
+and reused by later runs. Caches are emptied before every request so the
+route reads its whole history. Cursors are streamed in ledger.CHUNK_SIZE
+chunks, so the peaks must stay flat as rows grow: the run fails (exit
+status 1) if any route peaks above MAX_PEAK_MB, or if at the largest size
+it peaks above GROWTH times its peak at the smallest plus SLACK_MB.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PATHS = ('/dashboard', '/insights', '/api/chart_data', '/api/window_stats?window=90')
+MAX_PEAK_MB = 4.0
+GROWTH = 1.5
+SLACK_MB = 0.1  # room for noise on routes that peak at a few tens of KB
+CATEGORIES = ('Food', 'Travel', 'Shopping', 'Others', 'Fees', 'Recharge')
+
+
+def seed(conn, rows):
+    import ledger
+    rnd = random.Random(1)
+    today = ledger.today()
+    conn.execute("INSERT INTO users (username, password) VALUES ('bench', 'bench')")
+    for start in range(0, rows, 100000):
+        ledger.insert_transactions(conn, [
+            (1, rnd.randint(100, 90000), rnd.choice(CATEGORIES), rnd.choice(('expense', 'expense', 'income')),
+             'bench', today - rnd.randint(0, 3000))
+            for _ in range(min(100000, rows - start))
+        ])
+        conn.commit()
+
+
+def run(rows):
+    os.environ['DATABASE_PATH'] = os.path.join(tempfile.gettempdir(), f'bench_memory_{rows}.db')
+    seeded = os.path.exists(os.environ['DATABASE_PATH'])
+    for name in ('app', 'db'):
+        sys.modules.pop(name, None)  # rebind app to this size's database
+    import app
+
+    # Measure the view, not the template
+    app.render_template = lambda name, **context: ''
+    conn = app.db.connect(app.DATABASE)
+    if not seeded:
+        seed(conn, rows)
+
+    client = app.app.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    peaks = {}
+    for path in PATHS:
+        app.analytics_cache.invalidate(conn, 1)
+        app.rolling_windows = type(app.rolling_windows)(max_users=app.rolling_windows.max_users)
+        tracemalloc.start()
+        started = time.perf_counter()
+        status = client.get(path).status_code
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        peaks[path] = peak / 1e6
+        print(f'{rows:>9} {path:30} {status} peak {peaks[path]:6.2f} MB {elapsed * 1000:7.0f} ms')
+    conn.close()
+    return peaks
+
+
+def check(results):
+    """Failures of the bounded-memory limits for {rows: {path: peak MB}}."""
+    smallest, largest = results[min(results)], results[max(results)]
+    failures = []
+    for rows, peaks in sorted(results.items()):
+        failures += [f'{path} peaks at {peak:.2f} MB with {rows} rows (limit {MAX_PEAK_MB} MB)'
+                     for path, peak in peaks.items() if peak > MAX_PEAK_MB]
+    if len(results) > 1:
+        for path in PATHS:
+            if largest[path] > GROWTH * smallest[path] + SLACK_MB:
+                failures.append(f'{path} grows from {smallest[path]:.2f} MB at {min(results)} rows '
+                                f'to {largest[path]:.2f} MB at {max(results)} rows')
+    return failures
+
+
+if __name__ == '__main__':
+    results = {rows: run(rows) for rows in [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]}
+    failures = check(results)
+    for failure in failures:
+        print('FAIL', failure)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,119 @@
+"""
+Per-route latency with and without the transaction indexes, at several
+table sizes.
+
+    python benchmarks/bench_routes.py [rows ...]      (default 10000 1000000 10000000)
+
+Each size is spread over USERS accounts and seeded once into a scratch
+database under the temp directory, reused by later runs; 10M rows take a
+while to seed and need a few GB of disk. For every size the routes are
+timed for one account with its caches emptied before each request, first
+with the indexes migrations create on transactions ("after"), then with
+those indexes dropped ("before"). The indexes are recreated afterwards.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+USERS = 1000
+REQUESTS = 20  # per route, size and index state
+SEED_CHUNK = 100000
+CATEGORIES = ('Food', 'Travel', 'Shopping', 'Bills', 'Others')
+INDEXES = ('idx_transactions_user_day', 'idx_transactions_user_type_category')
+
+ROUTES = (
+    ('dashboard', 'GET', '/dashboard', None),
+    ('insights', 'GET', '/insights', None),
+    ('chart_data', 'GET', '/api/chart_data', None),
+    ('window_stats', 'GET', '/api/window_stats?window=30', None),
+    ('check_budget', 'POST', '/check_budget', {'amount': 300}),
+    ('should_i_buy', 'POST', '/api/should_i_buy', {'item_name': 'Shoes', 'price': 1500}),
+)
+
+
+def seed(conn, rows):
+    import ledger
+    rnd = random.Random(2)
+    today = ledger.today()
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, 'bench')",
+                     [(f'bench{i}',) for i in range(USERS)])
+    user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+    for start in range(0, rows, SEED_CHUNK):
+        batch = []
+        for i in range(start, min(rows, start + SEED_CHUNK)):
+            user_id = user_ids[i % USERS]
+            if i // USERS % 20 == 0:
+                batch.append((user_id, rnd.randint(500000, 5000000), 'Income', 'income', 'salary',
+                              today - rnd.randint(0, 730)))
+            else:
+                batch.append((user_id, rnd.randint(500, 60000), rnd.choice(CATEGORIES), 'expense', 'bench',
+                              today - rnd.randint(0, 730)))
+        ledger.insert_transactions(conn, batch)
+        conn.commit()
+
+
+def time_routes(app, conn, client, user_id):
+    timings = {}
+    for name, method, path, body in ROUTES:
+        times = []
+        for _ in range(REQUESTS):
+            app.analytics_cache.invalidate(conn, user_id)
+            app.safe_spend_cache.discard(user_id)
+            app.rolling_windows = type(app.rolling_windows)(max_users=app.rolling_windows.max_users)
+            started = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            times.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, (name, response.status_code)
+        times.sort()
+        timings[name] = (statistics.median(times), times[int(len(times) * .95)])
+    return timings
+
+
+def run(rows):
+    os.environ['DATABASE_PATH'] = os.path.join(tempfile.gettempdir(), f'bench_routes_{rows}.db')
+    seeded = os.path.exists(os.environ['DATABASE_PATH'])
+    for name in ('app', 'db'):
+        sys.modules.pop(name, None)  # rebind app to this size's database
+    import app
+
+    # Measure the view, not the template
+    app.render_template = lambda name, **context: ''
+    app.app.config['TESTING'] = True
+    conn = app.db.connect(app.DATABASE)
+    if not seeded:
+        started = time.perf_counter()
+        seed(conn, rows)
+        print(f'seeded {rows} rows in {time.perf_counter() - started:.0f} s')
+
+    client = app.app.test_client()
+    client.post('/login', data={'username': 'bench0', 'password': 'bench'})
+    user_id = conn.execute("SELECT id FROM users WHERE username = 'bench0'").fetchone()[0]
+
+    after = time_routes(app, conn, client, user_id)
+    definitions = [row[0] for row in conn.execute(
+        f"SELECT sql FROM sqlite_master WHERE type = 'index' AND name IN ({','.join('?' * len(INDEXES))})", INDEXES)]
+    try:
+        for name in INDEXES:
+            conn.execute(f'DROP INDEX IF EXISTS {name}')
+        conn.commit()
+        before = time_routes(app, conn, client, user_id)
+    finally:
+        for sql in definitions:
+            conn.execute(sql)
+        conn.commit()
+    conn.close()
+
+    for name, _, _, _ in ROUTES:
+        print(f'{rows:>9} {name:13} before p50 {before[name][0]:8.2f} p95 {before[name][1]:8.2f} ms'
+              f'   after p50 {after[name][0]:8.2f} p95 {after[name][1]:8.2f} ms')
+
+
+if __name__ == '__main__':
+    for rows in [int(arg) for arg in sys.argv[1:]] or [10000, 1000000, 10000000]:
+        run(rows)
@@ -0,0 +1,110 @@
+"""
+Quick-add write throughput: a commit per row versus the write-behind queue.
+
+    python benchmarks/bench_writebehind.py [--rows 20000] [--threads 4] [--http]
+
+Library level: THREADS producers insert ROWS rows into a fresh scratch
+database, either each on its own connection with a commit per row (what
+/api/quick_add does by default) or through writebehind.WriteBehindQueue,
+timed until the queue is closed and every row is on disk. The row counts
+are checked afterwards.
+
+With --http, bench_gunicorn also runs quick_add-only clients against one
+gthread worker without and with QUICK_ADD_WRITE_BEHIND=1, then again
+while a 20k-row import loops alongside.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import db
+import ledger
+import writebehind
+from migrations import migrate
+
+
+def scratch(directory, name):
+    conn = db.connect(os.path.join(directory, name))
+    migrate(conn)
+    conn.execute("INSERT INTO users (username, password) VALUES ('bench', 'bench')")
+    conn.commit()
+    return conn
+
+
+def rows_for(rows):
+    today = ledger.today()
+    return [(1, 1200, 'Food', 'expense', 'tea', today) for _ in range(rows)]
+
+
+def produce(threads, rows, insert):
+    """Split ``rows`` over ``threads`` threads calling insert(row); returns seconds."""
+    share = len(rows) // threads
+    chunks = [rows[i * share:(i + 1) * share] for i in range(threads - 1)] + [rows[(threads - 1) * share:]]
+    workers = [threading.Thread(target=lambda chunk=chunk: [insert(row) for row in chunk]) for chunk in chunks]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - started
+
+
+def per_row(directory, rows, threads):
+    conn = scratch(directory, 'per_row.db')
+    path = os.path.join(directory, 'per_row.db')
+    local = threading.local()
+
+    def insert(row):
+        if not hasattr(local, 'conn'):
+            local.conn = db.connect(path)
+        ledger.insert_transactions(local.conn, [row])
+        local.conn.commit()
+
+    seconds = produce(threads, rows, insert)
+    return seconds, conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+
+def queued(directory, rows, threads):
+    conn = scratch(directory, 'queued.db')
+    queue = writebehind.WriteBehindQueue(os.path.join(directory, 'queued.db'))
+    started = time.perf_counter()
+    produce(threads, rows, queue.submit)
+    queue.close()
+    seconds = time.perf_counter() - started
+    print(f'  queue stats {queue.stats}')
+    return seconds, conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Commit per row versus the write-behind queue.')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--http', action='store_true', help='also load test gunicorn with and without the queue')
+    parser.add_argument('--seconds', type=float, default=10, help='length of each --http run')
+    args = parser.parse_args(argv)
+
+    rows = rows_for(args.rows)
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        for name, method in (('commit per row', per_row), ('write-behind', queued)):
+            seconds, stored = method(directory, rows, args.threads)
+            print(f'{name:15} {len(rows) / seconds:9.0f} rows/s  ({seconds:.2f} s, {stored} rows stored)')
+            failed |= stored != len(rows)
+
+    if args.http:
+        import bench_gunicorn
+        for import_load in (False, True):
+            print('quick_add only' + (' with an import running' if import_load else ''))
+            for config in ('gthread', 'write-behind'):
+                bench_gunicorn.run(config, 16, args.seconds, bench_gunicorn.QUICK_ADD_ONLY, import_load)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
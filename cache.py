@@ -0,0 +1,148 @@
+"""
+Per-user cache for computed analytics (month totals, weekly insights,
+streaks, insights aggregates).
+
+Every cached value is stamped with the user's ``data_version``, a counter
+that triggers bump whenever the user's transactions or budget change. A
+lookup whose version no longer matches is a miss, so invalidation is exact
+even when the write happened in another gunicorn worker. Entries also
+expire after a TTL, and the least recently used users are evicted once the
+cache holds ``max_users``.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+def get_data_version(conn, user_id):
+    row = conn.execute('SELECT data_version FROM users WHERE id = ?', (user_id,)).fetchone()
+    return row['data_version'] if row else 0
+
+
+class MemoryStore:
+    """In-process LRU store: user_id -> {key: (version, expires, value)}."""
+
+    def __init__(self, max_users):
+        self.max_users = max_users
+        self._users = OrderedDict()
+
+    def get(self, conn, user_id, key):
+        entries = self._users.get(user_id)
+        if entries is None:
+            return None
+        self._users.move_to_end(user_id)
+        return entries.get(key)
+
+    def put(self, conn, user_id, key, record):
+        """Store a record; returns the number of users evicted."""
+        entries = self._users.get(user_id)
+        if entries is None:
+            entries = self._users[user_id] = {}
+        else:
+            self._users.move_to_end(user_id)
+        entries[key] = record
+        evicted = 0
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def discard(self, conn, user_id):
+        self._users.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._users)
+
+
+class SQLiteStore:
+    """
+    Store shared by all workers through the analytics_cache table. Values
+    must be JSON-serialisable; tuples come back as lists. Eviction drops
+    the users whose entries were written longest ago.
+    """
+
+    def __init__(self, max_users):
+        self.max_users = max_users
+
+    def get(self, conn, user_id, key):
+        row = conn.execute(
+            'SELECT version, expires, value FROM analytics_cache WHERE user_id = ? AND key = ?',
+            (user_id, key),
+        ).fetchone()
+        if row is None:
+            return None
+        return row['version'], row['expires'], json.loads(row['value'])
+
+    def put(self, conn, user_id, key, record):
+        version, expires, value = record
+        conn.execute('''
+            INSERT OR REPLACE INTO analytics_cache (user_id, key, version, expires, value, stored_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (user_id, key, version, expires, json.dumps(value), time.time()))
+        evicted = conn.execute('''
+            DELETE FROM analytics_cache WHERE user_id IN (
+                SELECT user_id FROM analytics_cache
+                GROUP BY user_id
+                ORDER BY MAX(stored_at) DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_users,)).rowcount
+        conn.commit()
+        return evicted
+
+    def discard(self, conn, user_id):
+        conn.execute('DELETE FROM analytics_cache WHERE user_id = ?', (user_id,))
+        conn.commit()
+
+
+class AnalyticsCache:
+    def __init__(self, max_users=1024, ttl=300, backend='memory'):
+        self.ttl = ttl
+        if backend == 'sqlite':
+            self.store = SQLiteStore(max_users)
+        else:
+            self.store = MemoryStore(max_users)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, conn, user_id, key, compute):
+        """
+        Return the cached value of ``key`` for the user, calling ``compute()``
+        and caching its result when missing, stale or expired.
+        """
+        version = get_data_version(conn, user_id)
+        now = time.time()
+        with self._lock:
+            record = self.store.get(conn, user_id, key)
+            if record is not None and record[0] == version and record[1] > now:
+                self.hits += 1
+                return record[2]
+            self.misses += 1
+
+        value = compute()
+        with self._lock:
+            self.evictions += self.store.put(conn, user_id, key, (version, now + self.ttl, value))
+        return value
+
+    def invalidate(self, conn, user_id):
+        """Drop everything cached for the user (call after their writes)."""
+        with self._lock:
+            self.store.discard(conn, user_id)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                # Only the in-process store knows its size without a query
+                'users': len(self.store) if isinstance(self.store, MemoryStore) else None,
+            }
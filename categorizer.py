@@ -0,0 +1,123 @@
+"""
+Multi-pattern keyword categorizer.
+
+All keywords of a table are compiled once into an Aho–Corasick automaton,
+so a description is scanned a single time regardless of how many keywords
+there are. Each rule carries a priority (lower wins; ties go to the
+leftmost, then longest match) and an optional whole-word flag so short
+keywords like 'vi' or 'ola' no longer fire inside 'movie' or 'chocolate'.
+"""
+import json
+from collections import deque, namedtuple
+from functools import lru_cache
+
+Rule = namedtuple('Rule', 'keyword value priority whole_word')
+
+# Keyword table for auto_categorize: (category, whole_word, keywords), in
+# priority order
+DEFAULT_TABLE = (
+    ('Food', False, ('swiggy', 'zomato', 'dominos', 'mcdonalds', 'cafe', 'coffee')),
+    ('Travel', False, ('uber', 'rapido', 'metro', 'train')),
+    ('Travel', True, ('ola', 'bus')),
+    ('Shopping', False, ('amazon', 'flipkart', 'myntra', 'zara', 'h&m')),
+    ('Recharge', False, ('jio', 'airtel', 'wifi', 'internet')),
+    ('Recharge', True, ('vi',)),
+    ('Fees', False, ('fees', 'college', 'tuition', 'library', 'exam')),
+    ('Entertainment', False, ('movie', 'netflix', 'spotify', 'steam')),
+)
+
+
+def rules_from_table(table):
+    """Build rules from (value, whole_word, keywords) rows; row order is priority."""
+    priorities = {}
+    rules = []
+    for value, whole_word, keywords in table:
+        key = json.dumps(value) if not isinstance(value, str) else value
+        priority = priorities.setdefault(key, len(priorities))
+        for keyword in keywords:
+            rules.append(Rule(keyword.lower(), value, priority, whole_word))
+    return rules
+
+
+def load_rules(path):
+    """
+    Load a keyword table from a JSON file shaped like
+    [{"category": "Food", "keywords": ["swiggy"], "whole_word": false}, ...].
+    """
+    with open(path, encoding='utf-8') as f:
+        rows = json.load(f)
+    return rules_from_table(
+        (row['category'], bool(row.get('whole_word', False)), row['keywords']) for row in rows
+    )
+
+
+def _is_word_char(ch):
+    return ch.isalnum()
+
+
+class Categorizer:
+    def __init__(self, rules, default=None, cache_size=4096):
+        self.default = default
+        self.rules = list(rules)
+        self._build()
+        # Descriptions repeat a lot (quick-add buttons, recurring merchants)
+        self.categorize = lru_cache(maxsize=cache_size)(self._categorize)
+
+    def _build(self):
+        # Trie of keywords; out[state] lists the rules ending at that state
+        goto = [{}]
+        out = [()]
+        for index, rule in enumerate(self.rules):
+            node = 0
+            for ch in rule.keyword:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(())
+                node = nxt
+            out[node] = out[node] + (index,)
+
+        # Breadth-first failure links, folded straight into a full transition
+        # table so scanning never has to follow them at match time
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            delta[node] = {**delta[fail[node]], **goto[node]}
+            out[node] = out[node] + out[fail[node]]
+            for ch, child in goto[node].items():
+                fail[child] = delta[fail[node]].get(ch, 0)
+                queue.append(child)
+        self._delta = delta
+        self._out = out
+
+    def scan(self, text):
+        """Yield (start, rule) for every keyword occurrence in lowercased text."""
+        delta, out, rules = self._delta, self._out, self.rules
+        node = 0
+        for end, ch in enumerate(text):
+            node = delta[node].get(ch, 0)
+            if not out[node]:
+                continue
+            for index in out[node]:
+                rule = rules[index]
+                start = end - len(rule.keyword) + 1
+                if rule.whole_word and (
+                    (start > 0 and _is_word_char(text[start - 1]))
+                    or (end + 1 < len(text) and _is_word_char(text[end + 1]))
+                ):
+                    continue
+                yield start, rule
+
+    def _categorize(self, text):
+        best = None
+        best_key = None
+        for start, rule in self.scan(text.lower()):
+            key = (rule.priority, start, -len(rule.keyword))
+            if best_key is None or key < best_key:
+                best, best_key = rule, key
+        return best.value if best is not None else self.default
@@ -0,0 +1,246 @@
+"""
+Live update events for the dashboard's Server-Sent Events stream.
+
+Write endpoints publish a small event per user (the new transaction plus
+the recomputed balance, safe daily spend and streak) and every open
+/api/events stream of that user receives it, so pages update in place
+instead of polling or reloading.
+
+Backends, chosen with LIVE_EVENTS_BACKEND:
+  memory  in-process queues; streams only see writes made by the same
+          worker
+  sqlite  events are appended to the live_events table and each stream
+          polls it, so a write in one gunicorn worker reaches streams held
+          by any other; open streams keep a leased row in live_listeners
+          so writes for users with no stream anywhere publish nothing
+
+Every open stream holds a worker thread, so each worker serves at most
+``max_streams`` of them; past that stream() returns None and the page polls
+instead (see /api/live_state).
+"""
+import json
+import queue
+import threading
+import time
+
+import db
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 5000
+# How long a stream's live_listeners row counts without being renewed; a
+# worker that dies with streams open stops drawing events after this
+LISTENER_LEASE_SECONDS = 3 * HEARTBEAT_SECONDS
+
+
+class MemoryBroker:
+    def __init__(self):
+        self._subscribers = {}  # user_id -> set of queues
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def has_listeners(self, conn, user_id):
+        return bool(self._subscribers.get(user_id))
+
+    def publish(self, conn, user_id, event):
+        with self._lock:
+            self._next_id += 1
+            event = dict(event, id=self._next_id)
+            targets = list(self._subscribers.get(user_id, ()))
+        for q in targets:
+            q.put(event)
+
+    def subscribe(self, user_id):
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+        return _MemorySubscription(self, user_id, q)
+
+    def _unsubscribe(self, user_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+
+class _MemorySubscription:
+    def __init__(self, broker, user_id, q):
+        self._broker = broker
+        self._user_id = user_id
+        self._queue = q
+
+    def get(self, timeout):
+        """Events published since the last call, waiting up to timeout seconds."""
+        try:
+            events = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def close(self):
+        self._broker._unsubscribe(self._user_id, self._queue)
+
+
+class SQLiteBroker:
+    """
+    Cross-worker broker over the live_events table. Each subscription polls
+    with its own connection so long-lived streams never hold a pooled one;
+    events older than ``retention`` seconds are pruned as new ones arrive.
+    """
+
+    def __init__(self, database, poll_interval=1.0, retention=300):
+        self.database = database
+        self.poll_interval = poll_interval
+        self.retention = retention
+
+    def has_listeners(self, conn, user_id):
+        # Streams in any worker, through their leased live_listeners rows
+        return conn.execute(
+            'SELECT 1 FROM live_listeners WHERE user_id = ? AND expires > ? LIMIT 1',
+            (user_id, time.time()),
+        ).fetchone() is not None
+
+    def publish(self, conn, user_id, event):
+        now = time.time()
+        conn.execute('INSERT INTO live_events (user_id, payload, created) VALUES (?, ?, ?)',
+                     (user_id, json.dumps(event), now))
+        conn.execute('DELETE FROM live_events WHERE created < ?', (now - self.retention,))
+        conn.commit()
+
+    def subscribe(self, user_id):
+        return _SQLiteSubscription(self, user_id)
+
+
+class _SQLiteSubscription:
+    def __init__(self, broker, user_id):
+        self._broker = broker
+        self._user_id = user_id
+        self._conn = db.connect(broker.database)
+        self._last_id = self._conn.execute(
+            'SELECT COALESCE(MAX(id), 0) FROM live_events').fetchone()[0]
+        now = time.time()
+        self._conn.execute('DELETE FROM live_listeners WHERE expires < ?', (now,))
+        self._listener_id = self._conn.execute(
+            'INSERT INTO live_listeners (user_id, expires) VALUES (?, ?)',
+            (user_id, now + LISTENER_LEASE_SECONDS),
+        ).lastrowid
+        self._conn.commit()
+        self._renew_at = now + LISTENER_LEASE_SECONDS / 3
+
+    def _renew(self):
+        now = time.time()
+        if now >= self._renew_at:
+            self._conn.execute('UPDATE live_listeners SET expires = ? WHERE id = ?',
+                               (now + LISTENER_LEASE_SECONDS, self._listener_id))
+            self._conn.commit()
+            self._renew_at = now + LISTENER_LEASE_SECONDS / 3
+
+    def get(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            self._renew()
+            rows = self._conn.execute(
+                'SELECT id, payload FROM live_events WHERE user_id = ? AND id > ? ORDER BY id',
+                (self._user_id, self._last_id),
+            ).fetchall()
+            if rows:
+                self._last_id = rows[-1]['id']
+                return [dict(json.loads(row['payload']), id=row['id']) for row in rows]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(self._broker.poll_interval, remaining))
+
+    def close(self):
+        try:
+            self._conn.execute('DELETE FROM live_listeners WHERE id = ?', (self._listener_id,))
+            self._conn.commit()
+        finally:
+            self._conn.close()
+
+
+def format_sse(event):
+    """One event in text/event-stream framing."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+class _Stream:
+    """SSE response body that gives its stream slot back once closed or exhausted."""
+
+    def __init__(self, bus, events):
+        self._bus = bus
+        self._events = events
+        self._open = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._events)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if self._open:
+            self._open = False
+            self._events.close()
+            self._bus._release()
+
+
+class EventBus:
+    def __init__(self, backend='memory', database=None, poll_interval=1.0, max_streams=None):
+        self.max_streams = max_streams  # None: no limit
+        self._streams = 0
+        self._lock = threading.Lock()
+        if backend == 'sqlite':
+            self.broker = SQLiteBroker(database, poll_interval)
+        elif backend == 'memory':
+            self.broker = MemoryBroker()
+        else:
+            raise ValueError(f"Unknown live events backend {backend!r}")
+
+    def has_listeners(self, conn, user_id):
+        return self.broker.has_listeners(conn, user_id)
+
+    def publish(self, conn, user_id, event_type, data):
+        self.broker.publish(conn, user_id, {'type': event_type, 'data': data})
+
+    def stream(self, user_id, max_seconds=300, heartbeat=HEARTBEAT_SECONDS):
+        """
+        Iterable of SSE text for one client, or None when this worker
+        already holds ``max_streams``. Ends after ``max_seconds`` so a
+        worker thread is never held forever; EventSource reconnects.
+        """
+        with self._lock:
+            if self.max_streams is not None and self._streams >= self.max_streams:
+                return None
+            self._streams += 1
+        return _Stream(self, self._events(user_id, max_seconds, heartbeat))
+
+    def _release(self):
+        with self._lock:
+            self._streams -= 1
+
+    def _events(self, user_id, max_seconds, heartbeat):
+        subscription = self.broker.subscribe(user_id)
+        deadline = time.monotonic() + max_seconds
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                events = subscription.get(min(heartbeat, remaining))
+                if not events:
+                    yield ": keep-alive\n\n"
+                for event in events:
+                    yield format_sse(event)
+        finally:
+            subscription.close()
@@ -0,0 +1,158 @@
+"""
+Vectorised balance forecasting.
+
+Every function works on a batch: ``series`` is an (n_users, n_days) array
+of daily expense totals (oldest day first) and ``balances`` an (n_users,)
+array, so the nightly job can forecast thousands of users in one call and
+a request simply passes a batch of one. Results are plain NumPy arrays;
+call ``.tolist()`` before handing them to templates or jsonify.
+
+Projection methods:
+  flat      mean daily spend over the series
+  ewma      exponentially weighted mean, recent days weigh more
+  seasonal  mean spend per weekday, falling back to the flat mean for
+            weekdays the series never saw
+"""
+import numpy as np
+
+METHODS = ('flat', 'ewma', 'seasonal')
+EWMA_ALPHA = 0.3
+# Days of spending, up to today, that a balance forecast is projected from
+LOOKBACK_DAYS = 28
+
+
+def load_daily_expenses(conn, user_ids, start_day, end_day):
+    """
+    Daily expense totals in rupees for each user over [start_day, end_day]
+    as an (len(user_ids), days) array, read from the daily rollups.
+    """
+    user_ids = list(user_ids)
+    n_days = end_day - start_day + 1
+    series = np.zeros((len(user_ids), max(n_days, 0)))
+    if not user_ids or n_days <= 0:
+        return series
+    row_of = {user_id: i for i, user_id in enumerate(user_ids)}
+    if len(user_ids) == 1:
+        cursor = conn.execute('''
+            SELECT user_id, day, SUM(total_paise) FROM daily_rollups
+            WHERE user_id = ? AND type = 'expense' AND day BETWEEN ? AND ?
+            GROUP BY day
+        ''', (user_ids[0], start_day, end_day))
+    else:
+        cursor = conn.execute('''
+            SELECT user_id, day, SUM(total_paise) FROM daily_rollups
+            WHERE type = 'expense' AND day BETWEEN ? AND ?
+            GROUP BY user_id, day
+        ''', (start_day, end_day))
+    rows = [(row_of[u], d - start_day, total) for u, d, total in cursor if u in row_of]
+    if rows:
+        r, c, totals = zip(*rows)
+        series[list(r), list(c)] = np.asarray(totals, dtype=float) / 100
+    return series
+
+
+def daily_spend_rates(series, horizon, method='flat', first_weekday=0, alpha=EWMA_ALPHA):
+    """
+    Projected spend for each of the next ``horizon`` days, shape
+    (n_users, horizon). ``first_weekday`` is the weekday (Monday == 0) of
+    series[:, 0]; the forecast starts the day after the series ends.
+    """
+    series = np.atleast_2d(np.asarray(series, dtype=float))
+    n, d = series.shape
+    if d == 0:
+        return np.zeros((n, horizon))
+    flat = series.mean(axis=1)
+
+    if method == 'flat':
+        rates = flat
+    elif method == 'ewma':
+        weights = (1 - alpha) ** np.arange(d - 1, -1, -1)
+        rates = series @ weights / weights.sum()
+    elif method == 'seasonal':
+        weekdays = (first_weekday + np.arange(d)) % 7
+        onehot = np.eye(7)[weekdays]  # (d, 7)
+        counts = onehot.sum(axis=0)
+        sums = series @ onehot  # (n, 7)
+        means = np.where(counts > 0, sums / np.maximum(counts, 1), flat[:, None])
+        future = (first_weekday + d + np.arange(horizon)) % 7
+        return means[:, future]
+    else:
+        raise ValueError(f"Unknown forecast method {method!r}")
+    return np.repeat(rates[:, None], horizon, axis=1)
+
+
+def project_from_spend(balances, spend, horizon):
+    """
+    Projected balance at the start of each of the next ``horizon`` days,
+    shape (n_users, horizon), floored at zero; column 0 is the current
+    balance. ``spend`` is a per-user daily rate (n_users,) or a full
+    (n_users, horizon) spend projection.
+    """
+    balances = np.asarray(balances, dtype=float).reshape(-1, 1)
+    spend = np.asarray(spend, dtype=float)
+    if spend.ndim < 2:
+        spend = spend.reshape(-1, 1)
+    spend = np.broadcast_to(spend, (balances.shape[0], horizon))
+    spent_before = np.cumsum(spend, axis=1) - spend
+    return np.maximum(balances - spent_before, 0)
+
+
+def project_balances(balances, series, horizon, method='flat', first_weekday=0, alpha=EWMA_ALPHA):
+    """project_from_spend() with the spend projected from ``series``."""
+    spend = daily_spend_rates(series, horizon, method, first_weekday, alpha)
+    return project_from_spend(balances, spend, horizon)
+
+
+def days_until_zero(balances, rates, never=999):
+    """Balance / daily spend rate, or ``never`` where nothing is being spent."""
+    balances = np.maximum(np.asarray(balances, dtype=float), 0)
+    rates = np.asarray(rates, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days = np.where(rates > 0, balances / rates, never)
+    return days
+
+
+SIMULATION_PATHS = 10000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def simulate_month_end(balance, history, horizon, price=0.0, n_paths=SIMULATION_PATHS,
+                       percentiles=PERCENTILES, rng=None):
+    """
+    Monte Carlo what-if: bootstrap ``history`` (one user's daily spend,
+    1-D) into ``n_paths`` spending trajectories over ``horizon`` days and
+    replay them from ``balance`` with and without spending ``price`` today.
+    Both scenarios share the same trajectories, so their difference is the
+    purchase alone.
+
+    Returns {'without': ..., 'with': ...}, each holding the run-out
+    probability, month-end balance percentiles and per-day percentile bands
+    (one list per entry of ``percentiles``).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    history = np.asarray(history, dtype=float).ravel()
+    horizon = max(int(horizon), 1)
+    if history.size == 0:
+        history = np.zeros(1)
+    samples = history[rng.integers(0, history.size, size=(n_paths, horizon))]
+    remaining = balance - np.cumsum(samples, axis=1)  # balance at the end of each day
+    q = np.asarray(percentiles, dtype=float)
+    # Percentiles shift with the balance, so the purchase scenario reuses
+    # the same bands instead of sorting the paths a second time
+    bands = np.percentile(remaining, q, axis=0)
+    final = remaining[:, -1]
+    labels = [f'p{int(p)}' for p in q]
+
+    def summarise(offset, start):
+        shifted = bands - offset
+        return {
+            'runout_probability': float((final < offset).mean()) if start >= 0 else 1.0,
+            'month_end': dict(zip(labels, shifted[:, -1].round(2).tolist())),
+            'bands': shifted.round(2).tolist(),
+        }
+
+    return {
+        'percentiles': [int(p) for p in q],
+        'without': summarise(0.0, balance),
+        'with': summarise(price, balance - price),
+    }
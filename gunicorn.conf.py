@@ -0,0 +1,40 @@
+"""
+Gunicorn settings, read automatically by `gunicorn app:app`.
+
+The JSON endpoints spend most of their time waiting on SQLite, so each
+worker runs a pool of threads (gthread): while one thread waits on a write
+lock or an fsync the others keep serving. Long-lived /api/events streams
+get threads of their own, up to a per-worker cap. Every value can be
+overridden from the environment.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+
+# Processes: CPU-bound work (NumPy forecasts, categorisation) scales with these
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+
+# Live events must cross processes once there is more than one: the memory
+# backend only reaches streams held by the worker that made the write
+if workers > 1:
+    if os.environ.setdefault('LIVE_EVENTS_BACKEND', 'sqlite') == 'memory':
+        raise SystemExit("LIVE_EVENTS_BACKEND=memory needs WEB_CONCURRENCY=1; use sqlite with several workers")
+
+# Threads per process: GUNICORN_THREADS for requests waiting on SQLite, plus
+# one per /api/events stream the worker may hold (LIVE_MAX_STREAMS, read by
+# app.py too), so open dashboards never take a request thread. Pages beyond
+# the stream limit poll /api/live_state instead.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+live_streams = int(os.environ.setdefault('LIVE_MAX_STREAMS', '32'))
+threads = int(os.environ.get('GUNICORN_THREADS', 8)) + live_streams
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+
+def worker_exit(server, worker):
+    # Commit queued write-behind quick adds before the worker goes away
+    import app
+    if app.quick_add_queue is not None:
+        app.quick_add_queue.close()
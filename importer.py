@@ -0,0 +1,166 @@
+"""
+Streaming bulk import of transactions from CSV or JSONL uploads.
+
+Records are parsed one line at a time and written with executemany in
+batches, each batch in its own transaction, so memory stays flat no matter
+how large the upload is.
+
+Recognised fields: amount (required), description, category, type
+('expense' by default) and date ('YYYY-MM-DD', today by default). Rows
+without a category are auto-categorised from their description; expense
+rows with one are passed to ``learn`` so the user's merchant index picks
+them up.
+
+A bad record only rejects its own row. If the upload turns out not to be
+UTF-8 partway through, or the CSV can't be split into rows, the open batch
+is rolled back and the summary reports the rows already committed along
+with the error.
+"""
+import csv
+import io
+import json
+import time
+
+import ledger
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+
+
+def _text(value):
+    """A field as stripped text; JSONL values may be numbers or null."""
+    return '' if value is None else str(value).strip()
+
+
+def detect_format(filename, first_line):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return 'jsonl' if first_line.lstrip().startswith('{') else 'csv'
+
+
+def iter_records(text_stream, fmt):
+    """Yield (line_number, dict) pairs from a text stream."""
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for record in reader:
+            yield reader.line_num, {(k or '').strip().lower(): v for k, v in record.items()}
+    else:
+        for line_number, line in enumerate(text_stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield line_number, None
+                continue
+            yield line_number, record if isinstance(record, dict) else None
+
+
+class RecordParser:
+    """Turns raw records into rows for ledger.insert_transactions()."""
+
+    def __init__(self, user_id, categorize):
+        self.user_id = user_id
+        self.categorize = categorize
+        self.today = ledger.today()
+        self._days = {}  # imports repeat the same few dates; parse each once
+
+    def _day(self, value):
+        value = _text(value)
+        if not value:
+            return self.today
+        day = self._days.get(value)
+        if day is None:
+            day = self._days[value] = ledger.to_day(value)
+        return day
+
+    def parse(self, record):
+        if record is None:
+            raise ValueError('malformed record')
+        amount_paise = ledger.to_paise(record.get('amount') or 0)
+        if amount_paise <= 0:
+            raise ValueError('amount must be positive')
+        t_type = (_text(record.get('type')) or 'expense').lower()
+        if t_type not in ('expense', 'income'):
+            raise ValueError(f'unknown type {t_type!r}')
+        description = _text(record.get('description'))
+        category = _text(record.get('category'))
+        explicit = bool(category)
+        if not explicit:
+            category = self.categorize(description)
+        return (self.user_id, amount_paise, category, t_type, description, self._day(record.get('date'))), explicit
+
+
+def import_transactions(conn, user_id, binary_stream, filename, categorize, learn=None,
+                        batch_size=BATCH_SIZE):
+    """
+    Import every record in ``binary_stream`` for the user and return a
+    summary with accepted/rejected counts, sample errors and duration.
+    An upload that isn't UTF-8, or CSV the reader can't split into rows
+    (an unterminated quote, an oversized field), stops the import; the
+    summary then has an 'error' and counts only the rows committed before
+    it.
+    """
+    started = time.perf_counter()
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    fmt = None
+    parser = RecordParser(user_id, categorize)
+    accepted = rejected = 0
+    errors = []
+    batch = []
+    learned = []
+    summary = {}
+    try:
+        first_line = text_stream.readline()
+        fmt = detect_format(filename, first_line)
+        lines = _prepend(first_line, text_stream)
+        for line_number, record in iter_records(lines, fmt):
+            try:
+                row, explicit = parser.parse(record)
+            except (ValueError, TypeError, OverflowError) as e:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': line_number, 'error': str(e)})
+                continue
+            batch.append(row)
+            if explicit and learn is not None and row[3] == 'expense':
+                learned.append((row[4], row[2]))
+            if len(batch) >= batch_size:
+                accepted += _flush(conn, batch, learned, learn)
+        if batch:
+            accepted += _flush(conn, batch, learned, learn)
+    except UnicodeDecodeError:
+        conn.rollback()
+        summary['error'] = 'File must be UTF-8 text'
+    except csv.Error as e:
+        conn.rollback()
+        summary['error'] = f'Malformed CSV: {e}'
+
+    summary.update({
+        'format': fmt,
+        'accepted': accepted,
+        'rejected': rejected,
+        'errors': errors,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
+    return summary
+
+
+def _prepend(first_line, text_stream):
+    if first_line:
+        yield first_line
+    yield from text_stream
+
+
+def _flush(conn, batch, learned, learn):
+    count = len(batch)
+    ledger.insert_transactions(conn, batch)
+    if learned:
+        learn(learned)
+        learned.clear()
+    conn.commit()
+    batch.clear()
+    return count
@@ -0,0 +1,385 @@
+"""
+Accessors for the transactions table.
+
+Dates are stored as integer day numbers (days since 1970-01-01) and amounts
+as integer paise, so range filters are plain integer comparisons and sums
+never accumulate float error. Routes and templates keep working with
+'YYYY-MM-DD' strings and rupee floats through the helpers below.
+"""
+import math
+from array import array
+from datetime import date, datetime
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+TRANSACTION_COLUMNS = 'id, user_id, amount_paise, category, type, description, day'
+
+# Rows pulled per fetchmany() call when streaming a cursor
+CHUNK_SIZE = 1000
+
+# Largest amount accepted for one transaction, in rupees; keeps paise sums
+# far inside SQLite's 64-bit integers
+MAX_AMOUNT = 10 ** 9
+
+
+def to_day(value):
+    """Convert a date, datetime or 'YYYY-MM-DD' string to a day number."""
+    if isinstance(value, str):
+        value = datetime.strptime(value, '%Y-%m-%d')
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() - EPOCH_ORDINAL
+
+
+def to_date(day):
+    return date.fromordinal(day + EPOCH_ORDINAL)
+
+
+def from_day(day):
+    """Day number -> 'YYYY-MM-DD'."""
+    return to_date(day).isoformat()
+
+
+def today():
+    return to_day(datetime.now())
+
+
+def month_start(now):
+    """Day number of the first day of now's month."""
+    return to_day(date(now.year, now.month, 1))
+
+
+def next_month_start(day):
+    """Day number of the first day of the month after ``day``'s."""
+    d = to_date(day)
+    return to_day(date(d.year + d.month // 12, d.month % 12 + 1, 1))
+
+
+def weekday(day):
+    """Monday == 0 ... Sunday == 6, matching date.weekday()."""
+    return (day + 3) % 7
+
+
+def check_amount(amount):
+    """
+    Return ``amount`` as a float, raising ValueError for NaN, infinity or
+    anything beyond MAX_AMOUNT rupees.
+    """
+    amount = float(amount)
+    if not math.isfinite(amount) or abs(amount) > MAX_AMOUNT:
+        raise ValueError(f'amount out of range: {amount!r}')
+    return amount
+
+
+def to_paise(amount):
+    return int(round(check_amount(amount) * 100))
+
+
+def from_paise(paise):
+    return (paise or 0) / 100
+
+
+def row_to_dict(row):
+    """Transaction row -> dict with the legacy 'date' and 'amount' keys."""
+    t = dict(row)
+    t['date'] = from_day(t['day'])
+    t['amount'] = from_paise(t['amount_paise'])
+    return t
+
+
+def iter_rows(cursor, chunk_size=CHUNK_SIZE):
+    """Yield a cursor's rows, fetched chunk_size at a time."""
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+class TransactionColumns:
+    """
+    Columnar transactions: parallel arrays of day, amount in paise, type
+    code and category code, with types and categories interned in small
+    lookup tables. A row costs ~20 bytes instead of a dict. Filled by
+    fetch_streak_days() for calculate_streak().
+    """
+    __slots__ = ('day', 'amount_paise', 'type_code', 'category_code', 'types', 'categories', '_codes')
+
+    def __init__(self):
+        self.day = array('l')
+        self.amount_paise = array('q')
+        self.type_code = array('B')
+        self.category_code = array('H')
+        self.types = []
+        self.categories = []
+        self._codes = ({}, {})
+
+    @classmethod
+    def from_cursor(cls, cursor, chunk_size=CHUNK_SIZE):
+        """Build from a cursor yielding (day, amount_paise, type, category) rows."""
+        columns = cls()
+        for day, amount_paise, t_type, category in iter_rows(cursor, chunk_size):
+            columns.append(day, amount_paise, t_type, category)
+        return columns
+
+    def _intern(self, which, value):
+        codes = self._codes[which]
+        code = codes.get(value)
+        if code is None:
+            table = self.types if which == 0 else self.categories
+            code = codes[value] = len(table)
+            table.append(value)
+        return code
+
+    def append(self, day, amount_paise, t_type, category):
+        self.day.append(day)
+        self.amount_paise.append(amount_paise or 0)
+        self.type_code.append(self._intern(0, t_type))
+        self.category_code.append(self._intern(1, category))
+
+    def type_code_of(self, t_type):
+        """Code of a type, or -1 when no row has it."""
+        return self._codes[0].get(t_type, -1)
+
+    def __len__(self):
+        return len(self.day)
+
+
+def iter_rollups(conn, user_id, since=None, t_type=None, newest_first=False):
+    """
+    Stream daily rollup rows (day, type, category, total_paise, txn_count)
+    for a user in day order, optionally limited to days >= since and one type.
+    """
+    sql = 'SELECT day, type, category, total_paise, txn_count FROM daily_rollups WHERE user_id = ?'
+    params = [user_id]
+    if since is not None:
+        sql += ' AND day >= ?'
+        params.append(since)
+    if t_type is not None:
+        sql += ' AND type = ?'
+        params.append(t_type)
+    sql += ' ORDER BY day DESC' if newest_first else ' ORDER BY day'
+    return iter_rows(conn.execute(sql, params))
+
+
+def fetch_month_summary(conn, user_id, month_start_day):
+    """
+    Income and expense totals (paise) since month_start_day, plus expense
+    totals per category, most recently used first.
+    """
+    summary = {'income': 0, 'expense': 0, 'categories': []}
+    for row in conn.execute('''
+        SELECT type, category, SUM(total_paise) AS total
+        FROM daily_rollups
+        WHERE user_id = ? AND day >= ?
+        GROUP BY type, category
+        ORDER BY MAX(day) DESC, category
+    ''', (user_id, month_start_day)):
+        if row['type'] in ('income', 'expense'):
+            summary[row['type']] += row['total']
+        if row['type'] == 'expense':
+            summary['categories'].append((row['category'], row['total']))
+    return summary
+
+
+def fetch_month_balance(conn, user_id, month_start_day):
+    """
+    (data_version, income, expense) for the month in one conditional
+    aggregate over the user's row and their rollups; amounts in paise.
+    """
+    row = conn.execute('''
+        SELECT u.data_version,
+            COALESCE(SUM(CASE WHEN r.type = 'income' THEN r.total_paise END), 0) AS income,
+            COALESCE(SUM(CASE WHEN r.type = 'expense' THEN r.total_paise END), 0) AS expense
+        FROM users u
+        LEFT JOIN daily_rollups r ON r.user_id = u.id AND r.day >= ?
+        WHERE u.id = ?
+    ''', (month_start_day, user_id)).fetchone()
+    return (row['data_version'] or 0, row['income'], row['expense'])
+
+
+def fetch_streak_days(conn, user_id, today, window=365):
+    """
+    TransactionColumns for calculate_streak: every active (day, type) in
+    the streak window plus the user's first day, which bounds the walk back.
+    """
+    cursor = conn.execute('''
+        SELECT day, 0, type, '' FROM daily_rollups
+        WHERE user_id = ? AND (
+            day >= ? OR day = (SELECT MIN(day) FROM daily_rollups WHERE user_id = ?)
+        )
+        GROUP BY day, type
+    ''', (user_id, today - window, user_id))
+    return TransactionColumns.from_cursor(cursor)
+
+
+def fetch_streak_state(conn, user_id):
+    """(first_day, last_expense_day) for the user, either None without data."""
+    row = conn.execute(
+        'SELECT first_day, last_expense_day FROM users WHERE id = ?', (user_id,)
+    ).fetchone()
+    return (row[0], row[1]) if row is not None else (None, None)
+
+
+def fetch_insights_aggregates(conn, user_id, month_start_day):
+    """
+    Lifetime spending aggregates for /insights, computed in SQL over the
+    daily rollups. Anything that isn't income counts as spending; the
+    month figures cover only the calendar month starting at
+    month_start_day, so future-dated expenses stay out of them. Amounts
+    are returned in paise.
+    """
+    totals = conn.execute('''
+        SELECT
+            COALESCE(SUM(CASE WHEN type = 'income' THEN total_paise END), 0) AS income,
+            COALESCE(SUM(CASE WHEN type <> 'income' THEN total_paise END), 0) AS expense,
+            COALESCE(SUM(CASE WHEN type <> 'income' AND (day + 3) % 7 >= 5 THEN total_paise END), 0) AS weekend,
+            COALESCE(SUM(CASE WHEN type <> 'income' AND category = 'Food' THEN total_paise END), 0) AS food,
+            COALESCE(SUM(CASE WHEN type <> 'income' AND day >= :month AND day < :next_month
+                THEN total_paise END), 0) AS month_expense,
+            COALESCE(SUM(CASE WHEN type <> 'income' AND day >= :month AND day < :next_month
+                THEN txn_count END), 0) AS month_count
+        FROM daily_rollups
+        WHERE user_id = :user_id
+    ''', {'user_id': user_id, 'month': month_start_day, 'next_month': next_month_start(month_start_day)}).fetchone()
+
+    # Most recently used categories first
+    categories = conn.execute('''
+        SELECT category, SUM(total_paise) AS total
+        FROM daily_rollups
+        WHERE user_id = ? AND type <> 'income'
+        GROUP BY category
+        ORDER BY MAX(day) DESC, category
+    ''', (user_id,))
+
+    # Last 30 days that had any spending, oldest first
+    daily = conn.execute('''
+        SELECT day, total FROM (
+            SELECT day, SUM(total_paise) AS total
+            FROM daily_rollups
+            WHERE user_id = ? AND type <> 'income'
+            GROUP BY day
+            ORDER BY day DESC
+            LIMIT 30
+        ) ORDER BY day
+    ''', (user_id,))
+
+    weekdays = [0] * 7
+    for row in conn.execute('''
+        SELECT (day + 3) % 7 AS weekday, SUM(total_paise) AS total
+        FROM daily_rollups
+        WHERE user_id = ? AND type <> 'income'
+        GROUP BY weekday
+    ''', (user_id,)):
+        weekdays[row['weekday']] = row['total']
+
+    return {
+        'income': totals['income'],
+        'expense': totals['expense'],
+        'weekend_expense': totals['weekend'],
+        'food_expense': totals['food'],
+        'month_expense': totals['month_expense'],
+        'month_count': totals['month_count'],
+        'categories': [(row['category'], row['total']) for row in iter_rows(categories)],
+        'daily': [(row['day'], row['total']) for row in iter_rows(daily)],
+        'weekdays': weekdays,
+    }
+
+
+def fetch_chart_series(conn, user_id, month_start_day, daily_since):
+    """
+    Every /api/chart_data series in one read of the daily rollups, amounts
+    in paise: this month's expense by category and income/expense by type,
+    daily expense from daily_since on, and lifetime expense by weekday
+    (Sunday == 0).
+    """
+    series = {'category': {}, 'type': {}, 'daily': {}, 'weekday': {}}
+    cursor = conn.execute('''
+        SELECT 'category', category, SUM(total_paise) FROM daily_rollups
+        WHERE user_id = :user_id AND day >= :month AND type = 'expense'
+        GROUP BY category
+        UNION ALL
+        SELECT 'type', type, SUM(total_paise) FROM daily_rollups
+        WHERE user_id = :user_id AND day >= :month
+        GROUP BY type
+        UNION ALL
+        SELECT 'daily', day, SUM(total_paise) FROM daily_rollups
+        WHERE user_id = :user_id AND day >= :since AND type = 'expense'
+        GROUP BY day
+        UNION ALL
+        SELECT 'weekday', (day + 4) % 7, SUM(total_paise) FROM daily_rollups
+        WHERE user_id = :user_id AND type = 'expense'
+        GROUP BY (day + 4) % 7
+    ''', {'user_id': user_id, 'month': month_start_day, 'since': daily_since})
+    for name, key, total in iter_rows(cursor):
+        series[name][key] = total
+    return {name: sorted(values.items()) for name, values in series.items()}
+
+
+def rollup_drift(conn):
+    """
+    Number of rows that differ between daily_rollups and a fresh aggregate
+    of the raw transactions, counted from both sides.
+    """
+    return conn.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT * FROM (
+                SELECT user_id, day, type, category, SUM(amount_paise), COUNT(*)
+                FROM transactions GROUP BY user_id, day, type, category
+                EXCEPT
+                SELECT user_id, day, type, category, total_paise, txn_count FROM daily_rollups
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT user_id, day, type, category, total_paise, txn_count FROM daily_rollups
+                EXCEPT
+                SELECT user_id, day, type, category, SUM(amount_paise), COUNT(*)
+                FROM transactions GROUP BY user_id, day, type, category
+            )
+        )
+    ''').fetchone()[0]
+
+
+def rebuild_rollups(conn):
+    """Regenerate daily_rollups from the raw transactions. The caller commits."""
+    conn.execute('DELETE FROM daily_rollups')
+    conn.execute('''
+        INSERT INTO daily_rollups (user_id, day, type, category, total_paise, txn_count)
+        SELECT user_id, day, type, category, SUM(amount_paise), COUNT(*)
+        FROM transactions
+        GROUP BY user_id, day, type, category
+    ''')
+
+
+def rebuild_streak_state(conn):
+    """Recompute every user's streak state from the raw transactions. The caller commits."""
+    conn.execute('''
+        UPDATE users SET
+            first_day = (SELECT MIN(day) FROM transactions WHERE user_id = users.id),
+            last_expense_day = (SELECT MAX(day) FROM transactions
+                                WHERE user_id = users.id AND type = 'expense')
+    ''')
+
+
+def insert_transaction(conn, user_id, amount, category, t_type, description, day):
+    """
+    Insert one transaction. ``amount`` is in rupees; the caller commits.
+    The daily_rollups triggers update the aggregates in the same transaction.
+    """
+    conn.execute('''
+        INSERT INTO transactions (user_id, amount_paise, category, type, description, day)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, to_paise(amount), category, t_type, description, day))
+
+
+def insert_transactions(conn, rows):
+    """
+    Bulk insert rows of (user_id, amount_paise, category, type, description,
+    day) with a single executemany. The caller commits.
+    """
+    conn.executemany('''
+        INSERT INTO transactions (user_id, amount_paise, category, type, description, day)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
@@ -0,0 +1,100 @@
+"""
+Per-user learned merchant -> category index.
+
+Whenever a user picks a category themselves, the normalised description
+(the "merchant key") is counted against that category in the
+merchant_categories table. auto_categorize consults the user's index
+before the global keyword table, so the next quick add for the same
+merchant lands in the category the user chose.
+
+Indexes are loaded per user on first use, kept in an LRU-bounded
+in-process cache, and updated incrementally on every learn; other workers
+pick up changes once their copy expires.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_NON_WORD_RE = re.compile(r'[^a-z&]+')
+MAX_KEY_WORDS = 4
+
+# Categories that mean "we don't know" are never learned
+UNLEARNED_CATEGORIES = {'', 'Others', 'Other'}
+
+
+def merchant_key(description):
+    """'Paid STARBUCKS #1234 ' -> 'paid starbucks'; None for empty text."""
+    words = _NON_WORD_RE.sub(' ', str(description or '').lower()).split()
+    if not words:
+        return None
+    return ' '.join(words[:MAX_KEY_WORDS])
+
+
+class MerchantIndex:
+    def __init__(self, max_users=2048, ttl=60):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._users = OrderedDict()  # user_id -> (loaded_at, {key: {category: count}})
+        self._lock = threading.Lock()
+
+    def _load(self, conn, user_id):
+        counts = {}
+        for row in conn.execute(
+            'SELECT merchant, category, count FROM merchant_categories WHERE user_id = ?', (user_id,)
+        ):
+            counts.setdefault(row['merchant'], {})[row['category']] = row['count']
+        return counts
+
+    def _get_counts(self, conn, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] + self.ttl > time.time():
+                self._users.move_to_end(user_id)
+                return entry[1]
+        counts = self._load(conn, user_id)
+        with self._lock:
+            self._users[user_id] = (time.time(), counts)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return counts
+
+    def lookup(self, conn, user_id, description):
+        """The user's most frequent category for this merchant, or None."""
+        key = merchant_key(description)
+        if key is None:
+            return None
+        counts = self._get_counts(conn, user_id)
+        with self._lock:
+            # learn() updates these dicts in place from other threads
+            categories = dict(counts.get(key) or {})
+        if not categories:
+            return None
+        return max(categories, key=categories.get)
+
+    def learn(self, conn, user_id, pairs):
+        """
+        Count (description, category) pairs of expenses the user
+        categorised by hand; income is never learned. Writes to merchant_categories; the caller commits.
+        """
+        updates = {}
+        for description, category in pairs:
+            key = merchant_key(description)
+            if key is None or (category or '') in UNLEARNED_CATEGORIES:
+                continue
+            updates[(key, category)] = updates.get((key, category), 0) + 1
+        if not updates:
+            return
+        conn.executemany('''
+            INSERT INTO merchant_categories (user_id, merchant, category, count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, merchant, category) DO UPDATE SET count = count + excluded.count
+        ''', [(user_id, key, category, n) for (key, category), n in updates.items()])
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None:
+                counts = entry[1]
+                for (key, category), n in updates.items():
+                    by_category = counts.setdefault(key, {})
+                    by_category[category] = by_category.get(category, 0) + n
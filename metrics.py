@@ -0,0 +1,141 @@
+"""
+A user's month metrics, computed in one place.
+
+MonthMetrics is built from ledger.fetch_month_summary(), a single grouped
+query over the month's daily rollups, and derives everything the routes
+show about the month: balance, average and safe daily spend, survival
+days, stability score and the safe purchase price. The dashboard,
+insights, check_budget, the purchase engine, live updates and the nightly
+pipeline all read the same snapshot, so their numbers always agree.
+
+SafeSpendCache is the fast path for /check_budget, which runs as the
+user types: it keeps only each user's safe daily spend.
+"""
+import calendar
+import math
+import threading
+from collections import OrderedDict
+
+import ledger
+from cache import get_data_version
+from predictions import compute_stability_score
+
+NO_SPEND_DAYS = 999  # survival when nothing has been spent yet
+
+
+def survival_days(balance, avg_daily_spend):
+    """Days ``balance`` lasts at ``avg_daily_spend`` a day."""
+    if avg_daily_spend > 0:
+        return balance / avg_daily_spend if balance > 0 else 0
+    return NO_SPEND_DAYS if balance > 0 else 0
+
+
+class MonthMetrics:
+    __slots__ = (
+        'today', 'days_in_month', 'days_passed', 'days_remaining',
+        'total_income', 'total_expense', 'categories',
+        'current_balance', 'available_balance', 'avg_daily_spend', 'safe_daily_spend',
+        'survival_days', 'days_to_zero', 'status', 'stability_score', 'safe_price',
+    )
+
+    today: int
+    days_in_month: int
+    days_passed: int
+    days_remaining: int
+    total_income: float
+    total_expense: float
+    categories: list  # [(category, paise)], most recently used first
+    current_balance: float  # can be negative
+    available_balance: float
+    avg_daily_spend: float
+    safe_daily_spend: float
+    survival_days: float
+    days_to_zero: int  # whole days left at this pace, 999 before any spending
+    status: str  # 'danger', 'warning' or 'success'
+    stability_score: int
+    safe_price: float
+
+    def __init__(self, summary, now):
+        self.today = ledger.to_day(now)
+        self.days_in_month = calendar.monthrange(now.year, now.month)[1]
+        self.days_passed = max(now.day, 1)
+        self.days_remaining = max(self.days_in_month - now.day, 1)
+
+        self.total_income = ledger.from_paise(summary['income'])
+        self.total_expense = ledger.from_paise(summary['expense'])
+        self.categories = summary['categories']
+
+        self.current_balance = self.total_income - self.total_expense
+        self.available_balance = max(self.current_balance, 0)
+        self.avg_daily_spend = self.total_expense / self.days_passed
+        self.safe_daily_spend = self.available_balance / self.days_remaining
+        self.survival_days = survival_days(self.current_balance, self.avg_daily_spend)
+
+        if self.avg_daily_spend > 0:
+            self.days_to_zero = int(self.survival_days)
+        else:
+            self.days_to_zero = NO_SPEND_DAYS
+        if self.days_to_zero < self.days_remaining:
+            self.status = 'danger'
+        elif self.days_to_zero <= self.days_remaining + 3:
+            self.status = 'warning'
+        else:
+            self.status = 'success'
+
+        self.stability_score = compute_stability_score(
+            self.total_income, self.total_expense, self.available_balance)
+
+        # Most that can be spent now while still lasting the month, rounded
+        # down to 50 for a friendly suggestion
+        spare = max(0.0, self.current_balance - self.avg_daily_spend * self.days_remaining)
+        self.safe_price = math.floor(spare / 50.0) * 50.0 if spare > 0 else 0
+
+    @classmethod
+    def load(cls, conn, user_id, now):
+        """Uncached snapshot straight from the rollups."""
+        return cls(ledger.fetch_month_summary(conn, user_id, ledger.month_start(now)), now)
+
+
+class SafeSpendCache:
+    """
+    Per-user safe daily spend, stamped with data_version and the day. A hit
+    costs one primary-key lookup of the version, so a write in any worker
+    invalidates it; a miss reloads the month with the single query of
+    ledger.fetch_month_balance().
+    """
+
+    def __init__(self, max_users=4096):
+        self.max_users = max_users
+        self._users = OrderedDict()  # user_id -> (data_version, day, safe_daily_spend)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conn, user_id, now):
+        today = ledger.to_day(now)
+        version = get_data_version(conn, user_id)
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] == version and entry[1] == today:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        version, income, expense = ledger.fetch_month_balance(conn, user_id, ledger.month_start(now))
+        summary = {'income': income, 'expense': expense, 'categories': []}
+        safe_daily_spend = MonthMetrics(summary, now).safe_daily_spend
+        with self._lock:
+            self._users[user_id] = (version, today, safe_daily_spend)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return safe_daily_spend
+
+    def discard(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'users': len(self._users)}
@@ -0,0 +1,366 @@
+"""
+Versioned schema migrations.
+
+The schema version lives in SQLite's ``PRAGMA user_version``. Each entry in
+MIGRATIONS upgrades the schema by one version; ``migrate()`` applies every
+pending step on startup, each inside its own write transaction.
+"""
+
+
+def _create_base_tables(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            monthly_budget REAL DEFAULT 5000,
+            savings_goal REAL DEFAULT 1000
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL, -- 'income' or 'expense'
+            description TEXT,
+            date TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+def _add_transaction_indexes(conn):
+    # Covers the month-window sums (dashboard, check_budget, should_i_buy,
+    # chart_data) without touching the table itself
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+        ON transactions (user_id, date, type, amount)
+    ''')
+    # Covers per-category totals
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transactions_user_type_category
+        ON transactions (user_id, type, category, amount)
+    ''')
+
+
+def _store_integer_days_and_paise(conn):
+    # Rebuild transactions with `day` (days since 1970-01-01) and
+    # `amount_paise` columns. Dates that don't parse fall back to today.
+    conn.execute('''
+        CREATE TABLE transactions_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount_paise INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL, -- 'income' or 'expense'
+            description TEXT,
+            day INTEGER NOT NULL, -- days since 1970-01-01
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO transactions_new (id, user_id, amount_paise, category, type, description, day)
+        SELECT
+            id,
+            user_id,
+            CAST(ROUND(amount * 100) AS INTEGER),
+            category,
+            type,
+            description,
+            CAST(COALESCE(julianday(date), julianday('now', 'localtime')) - 2440587.5 AS INTEGER)
+        FROM transactions
+    ''')
+    conn.execute('DROP TABLE transactions')
+    conn.execute('ALTER TABLE transactions_new RENAME TO transactions')
+    conn.execute('''
+        CREATE INDEX idx_transactions_user_day
+        ON transactions (user_id, day, type, amount_paise)
+    ''')
+    conn.execute('''
+        CREATE INDEX idx_transactions_user_type_category
+        ON transactions (user_id, type, category, amount_paise)
+    ''')
+
+
+def _add_daily_rollups(conn):
+    # Per user x day x type x category totals, kept current by triggers so
+    # every write path (including bulk inserts) maintains them
+    conn.execute('''
+        CREATE TABLE daily_rollups (
+            user_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total_paise INTEGER NOT NULL,
+            txn_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, type, category)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_transactions_rollup_insert
+        AFTER INSERT ON transactions
+        BEGIN
+            INSERT INTO daily_rollups (user_id, day, type, category, total_paise, txn_count)
+            VALUES (NEW.user_id, NEW.day, NEW.type, NEW.category, NEW.amount_paise, 1)
+            ON CONFLICT (user_id, day, type, category) DO UPDATE SET
+                total_paise = total_paise + excluded.total_paise,
+                txn_count = txn_count + 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_transactions_rollup_delete
+        AFTER DELETE ON transactions
+        BEGIN
+            UPDATE daily_rollups
+            SET total_paise = total_paise - OLD.amount_paise, txn_count = txn_count - 1
+            WHERE user_id = OLD.user_id AND day = OLD.day AND type = OLD.type AND category = OLD.category;
+            DELETE FROM daily_rollups
+            WHERE user_id = OLD.user_id AND day = OLD.day AND type = OLD.type AND category = OLD.category
+              AND txn_count <= 0;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER trg_transactions_rollup_update
+        AFTER UPDATE OF user_id, day, type, category, amount_paise ON transactions
+        BEGIN
+            UPDATE daily_rollups
+            SET total_paise = total_paise - OLD.amount_paise, txn_count = txn_count - 1
+            WHERE user_id = OLD.user_id AND day = OLD.day AND type = OLD.type AND category = OLD.category;
+            DELETE FROM daily_rollups
+            WHERE user_id = OLD.user_id AND day = OLD.day AND type = OLD.type AND category = OLD.category
+              AND txn_count <= 0;
+            INSERT INTO daily_rollups (user_id, day, type, category, total_paise, txn_count)
+            VALUES (NEW.user_id, NEW.day, NEW.type, NEW.category, NEW.amount_paise, 1)
+            ON CONFLICT (user_id, day, type, category) DO UPDATE SET
+                total_paise = total_paise + excluded.total_paise,
+                txn_count = txn_count + 1;
+        END
+    ''')
+    conn.execute('''
+        INSERT INTO daily_rollups (user_id, day, type, category, total_paise, txn_count)
+        SELECT user_id, day, type, category, SUM(amount_paise), COUNT(*)
+        FROM transactions
+        GROUP BY user_id, day, type, category
+    ''')
+
+
+def _add_user_data_version(conn):
+    # Bumped on every change to a user's transactions or budget; caches and
+    # HTTP validators compare against it instead of rescanning data
+    conn.execute('ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0')
+    for event, ref in (('INSERT', 'NEW'), ('DELETE', 'OLD'), ('UPDATE', 'NEW')):
+        conn.execute(f'''
+            CREATE TRIGGER trg_transactions_version_{event.lower()}
+            AFTER {event} ON transactions
+            BEGIN
+                UPDATE users SET data_version = data_version + 1 WHERE id = {ref}.user_id;
+            END
+        ''')
+    conn.execute('''
+        CREATE TRIGGER trg_users_version_budget
+        AFTER UPDATE OF monthly_budget, savings_goal ON users
+        BEGIN
+            UPDATE users SET data_version = data_version + 1 WHERE id = NEW.id;
+        END
+    ''')
+    # Backing table for the optional cross-worker analytics cache
+    conn.execute('''
+        CREATE TABLE analytics_cache (
+            user_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            expires REAL NOT NULL,
+            value TEXT NOT NULL,
+            stored_at REAL NOT NULL,
+            PRIMARY KEY (user_id, key)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _add_imported_messages(conn):
+    # Fingerprints of Smart Import messages, used to skip re-imported SMS
+    conn.execute('''
+        CREATE TABLE imported_messages (
+            user_id INTEGER NOT NULL,
+            message_hash TEXT NOT NULL,
+            PRIMARY KEY (user_id, message_hash)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _add_merchant_categories(conn):
+    # Learned per-user merchant -> category counts (see merchants.py);
+    # seeded from history by _reseed_merchant_categories
+    conn.execute('''
+        CREATE TABLE merchant_categories (
+            user_id INTEGER NOT NULL,
+            merchant TEXT NOT NULL,
+            category TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, merchant, category)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _add_streak_state(conn):
+    # Per-user first day and latest expense day, kept current by triggers,
+    # so the no-spend streak is a subtraction instead of a history scan
+    import ledger
+
+    conn.execute('ALTER TABLE users ADD COLUMN first_day INTEGER')
+    conn.execute('ALTER TABLE users ADD COLUMN last_expense_day INTEGER')
+    conn.execute('''
+        CREATE TRIGGER trg_transactions_streak_insert
+        AFTER INSERT ON transactions
+        BEGIN
+            UPDATE users SET
+                first_day = MIN(COALESCE(first_day, NEW.day), NEW.day),
+                last_expense_day = CASE WHEN NEW.type = 'expense'
+                    THEN MAX(COALESCE(last_expense_day, NEW.day), NEW.day)
+                    ELSE last_expense_day END
+            WHERE id = NEW.user_id;
+        END
+    ''')
+    # Deletes and edits are rare: recompute the affected users from the index
+    for event, refs in (('DELETE', ('OLD',)), ('UPDATE OF user_id, day, type', ('OLD', 'NEW'))):
+        body = ''.join(
+            f'''
+                UPDATE users SET
+                    first_day = (SELECT MIN(day) FROM transactions WHERE user_id = {ref}.user_id),
+                    last_expense_day = (SELECT MAX(day) FROM transactions
+                                        WHERE user_id = {ref}.user_id AND type = 'expense')
+                WHERE id = {ref}.user_id;'''
+            for ref in refs
+        )
+        conn.execute(f'''
+            CREATE TRIGGER trg_transactions_streak_{event.split()[0].lower()}
+            AFTER {event} ON transactions
+            BEGIN{body}
+            END
+        ''')
+    ledger.rebuild_streak_state(conn)
+
+
+def _add_live_events(conn):
+    # Outbox for the cross-worker live update backend (see events.py)
+    conn.execute('''
+        CREATE TABLE live_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            created REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_live_events_user ON live_events (user_id, id)')
+    conn.execute('CREATE INDEX idx_live_events_created ON live_events (created)')
+
+
+def _add_user_analytics(conn):
+    # Per-user results of the nightly batch pipeline (see nightly.py)
+    conn.execute('''
+        CREATE TABLE user_analytics (
+            user_id INTEGER PRIMARY KEY,
+            data_version INTEGER NOT NULL,
+            computed_at REAL NOT NULL,
+            payload TEXT NOT NULL
+        )
+    ''')
+
+
+def _reseed_merchant_categories(conn):
+    # Learn only expense rows whose category no keyword matcher would have
+    # given them. Rows the old substring auto_categorize filed (e.g.
+    # 'chocolate' -> Travel via 'ola') or that the keyword table already
+    # covers teach nothing, and income rows must never steer quick adds.
+    from categorizer import DEFAULT_TABLE, Categorizer, rules_from_table
+    from merchants import UNLEARNED_CATEGORIES, merchant_key
+
+    keywords = Categorizer(rules_from_table(DEFAULT_TABLE), default='Others')
+
+    def substring_category(text):
+        # The pre-automaton auto_categorize: first category with any keyword inside the text
+        for category, _, words in DEFAULT_TABLE:
+            if any(word in text for word in words):
+                return category
+        return 'Others'
+
+    counts = {}
+    for user_id, description, category in conn.execute(
+        "SELECT user_id, description, category FROM transactions WHERE type = 'expense'"
+    ):
+        key = merchant_key(description)
+        if key is None or category in UNLEARNED_CATEGORIES:
+            continue
+        text = str(description).lower()
+        if category in (substring_category(text), keywords.categorize(text)):
+            continue
+        counts[(user_id, key, category)] = counts.get((user_id, key, category), 0) + 1
+    conn.execute('DELETE FROM merchant_categories')
+    conn.executemany(
+        'INSERT INTO merchant_categories (user_id, merchant, category, count) VALUES (?, ?, ?, ?)',
+        [(*k, n) for k, n in counts.items()],
+    )
+
+
+def _add_live_listeners(conn):
+    # Leased row per open stream of the sqlite live backend, so writes can
+    # skip publishing for users nobody is watching (see events.py)
+    conn.execute('''
+        CREATE TABLE live_listeners (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            expires REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_live_listeners_user ON live_listeners (user_id, expires)')
+
+
+MIGRATIONS = [
+    _create_base_tables,
+    _add_transaction_indexes,
+    _store_integer_days_and_paise,
+    _add_daily_rollups,
+    _add_user_data_version,
+    _add_imported_messages,
+    _add_merchant_categories,
+    _add_streak_state,
+    _add_live_events,
+    _add_user_analytics,
+    _reseed_merchant_categories,
+    _add_live_listeners,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION. Returns the versions applied."""
+    applied = []
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # manage transactions explicitly
+    try:
+        while True:
+            # IMMEDIATE takes the write lock up front so concurrently booting
+            # workers wait for each other instead of applying a step twice
+            conn.execute('BEGIN IMMEDIATE')
+            version = get_version(conn)
+            if version >= SCHEMA_VERSION:
+                conn.execute('COMMIT')
+                break
+            try:
+                MIGRATIONS[version](conn)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            applied.append(version + 1)
+    finally:
+        conn.isolation_level = isolation_level
+    return applied
@@ -0,0 +1,190 @@
+"""
+Nightly batch analytics over every user.
+
+    python -m nightly [--database PATH] [--workers N] [--shards N]
+
+Users are split into contiguous id shards and the shards are spread over a
+multiprocessing pool; each worker opens its own connection, computes the
+analytics below for every user in its shard and writes them to the
+user_analytics table in one transaction. /api/analytics serves those rows
+directly while the user's data_version still matches.
+
+Per user: month balance, average daily spend, safe daily spend, survival
+days, stability score, no-spend streak, 7-day insights and suggestions.
+Suggestions and month-end forecasts are computed for a whole shard at
+once: one rule evaluation and one forecasting call over every user's
+daily spend.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+import advice
+import db
+import forecasting
+import ledger
+from cache import get_data_version
+from migrations import migrate
+from metrics import NO_SPEND_DAYS, MonthMetrics
+from predictions import current_streak
+from windows import RollingWindows
+
+DEFAULT_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "finance_tracker.db")
+SHARDS_PER_WORKER = 4
+
+
+def compute_user_analytics(conn, user_id, now, complete=True):
+    """
+    Everything the pipeline stores for one user, as a JSON-able dict.
+    With ``complete=False`` the batched parts are left to the caller:
+    add_suggestions() and add_forecasts().
+    """
+    metrics = MonthMetrics.load(conn, user_id, now)
+    weekly_insights = RollingWindows.from_rollups(conn, user_id, metrics.today).insights(7)
+    analytics = {
+        'day': ledger.from_day(metrics.today),
+        'current_balance': metrics.current_balance,
+        'available_balance': metrics.available_balance,
+        'avg_daily_spend': metrics.avg_daily_spend,
+        'safe_daily_spend': metrics.safe_daily_spend,
+        'days_remaining': metrics.days_remaining,
+        'survival_days': metrics.survival_days,
+        'stability_score': metrics.stability_score,
+        'streak': current_streak(conn, user_id, metrics.today),
+        'weekly_insights': weekly_insights,
+    }
+    if complete:
+        add_suggestions([analytics])
+        add_forecasts(conn, [user_id], [analytics], now)
+    return analytics
+
+
+def add_suggestions(analytics):
+    """Evaluate the weekly advice rules for many users' analytics in one batch."""
+    vectors = [advice.weekly_features(a['weekly_insights']) for a in analytics]
+    for a, messages in zip(analytics, advice.RULESET.evaluate_many(vectors, groups=('weekly',))):
+        a['suggestions'] = messages['weekly']
+
+
+def add_forecasts(conn, user_ids, analytics, now):
+    """
+    Month-end forecasts for many users in one batch, projected like the
+    dashboard chart's from the last LOOKBACK_DAYS of spending: the balance
+    left at the end of the month under each forecasting method, and the
+    days until it runs out at the recent (EWMA) spend rate.
+    """
+    if not user_ids:
+        return
+    today = ledger.to_day(now)
+    start = today - (forecasting.LOOKBACK_DAYS - 1)
+    series = forecasting.load_daily_expenses(conn, user_ids, start, today)
+    balances = np.array([a['available_balance'] for a in analytics])
+    horizon = analytics[0]['days_remaining']
+    first_weekday = ledger.weekday(start)
+    month_end = {
+        method: forecasting.project_balances(balances, series, horizon, method, first_weekday)[:, -1]
+        for method in forecasting.METHODS
+    }
+    rates = forecasting.daily_spend_rates(series, 1, 'ewma', first_weekday)[:, 0]
+    days = forecasting.days_until_zero(balances, rates, never=NO_SPEND_DAYS)
+    for i, a in enumerate(analytics):
+        a['forecast'] = {
+            'month_end_balance': {method: round(float(values[i]), 2) for method, values in month_end.items()},
+            'days_until_zero': round(float(days[i]), 1),
+        }
+
+
+def store_analytics(conn, rows):
+    """Upsert (user_id, data_version, payload) rows; the caller commits."""
+    conn.executemany('''
+        INSERT OR REPLACE INTO user_analytics (user_id, data_version, computed_at, payload)
+        VALUES (?, ?, ?, ?)
+    ''', [(user_id, version, time.time(), json.dumps(payload)) for user_id, version, payload in rows])
+
+
+def fetch_analytics(conn, user_id):
+    """Stored analytics for a user if still current, else None."""
+    row = conn.execute(
+        'SELECT data_version, payload FROM user_analytics WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    if row is None or row['data_version'] != get_data_version(conn, user_id):
+        return None
+    payload = json.loads(row['payload'])
+    return payload if payload['day'] == ledger.from_day(ledger.today()) else None
+
+
+def run_shard(task):
+    """Compute and store one shard; returns (shard, users, seconds)."""
+    database, shard, user_ids, timestamp = task
+    started = time.perf_counter()
+    now = datetime.fromtimestamp(timestamp)
+    conn = db.connect(database)
+    try:
+        rows = [
+            (user_id, get_data_version(conn, user_id), compute_user_analytics(conn, user_id, now, complete=False))
+            for user_id in user_ids
+        ]
+        add_suggestions([payload for _, _, payload in rows])
+        add_forecasts(conn, user_ids, [payload for _, _, payload in rows], now)
+        store_analytics(conn, rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return shard, len(user_ids), time.perf_counter() - started
+
+
+def shard_user_ids(user_ids, shards):
+    """Split ids into at most ``shards`` contiguous, nearly equal chunks."""
+    shards = max(1, min(shards, len(user_ids)))
+    size, extra = divmod(len(user_ids), shards)
+    chunks, start = [], 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(user_ids[start:end])
+        start = end
+    return chunks
+
+
+def run(database, workers=None, shards=None, now=None, report=print):
+    """Run the pipeline; returns per-shard (shard, users, seconds) timings."""
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers * SHARDS_PER_WORKER
+    timestamp = (now or datetime.now()).timestamp()
+
+    conn = db.connect(database)
+    migrate(conn)
+    user_ids = [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id')]
+    conn.close()
+    tasks = [(database, i, chunk, timestamp) for i, chunk in enumerate(shard_user_ids(user_ids, shards))]
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = [run_shard(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = list(pool.imap_unordered(run_shard, tasks))
+    elapsed = time.perf_counter() - started
+
+    for shard, count, seconds in sorted(results):
+        report(f"shard {shard:3d}: {count:6d} users in {seconds:7.2f}s")
+    report(f"{len(user_ids)} users, {len(tasks)} shards, {workers} workers: {elapsed:.2f}s")
+    return sorted(results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute per-user analytics.")
+    parser.add_argument('--database', default=DEFAULT_DATABASE)
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument('--shards', type=int, default=None,
+                        help=f"user shards (default: {SHARDS_PER_WORKER} per worker)")
+    args = parser.parse_args(argv)
+    run(args.database, args.workers, args.shards)
+
+
+if __name__ == '__main__':
+    main()
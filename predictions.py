@@ -1,15 +1,16 @@
-from datetime import datetime, timedelta
+import advice
+import ledger
 
 def get_weekly_insights(transactions, now):
-    """Calculate weekly insights from transactions."""
-    seven_days_ago_str = (now - timedelta(days=7)).strftime('%Y-%m-%d')
-    weekly_txns = [t for t in transactions if t['date'] >= seven_days_ago_str and t['type'] == 'expense']
+    """Calculate weekly insights from a list of transaction dicts."""
+    seven_days_ago = ledger.to_day(now) - 7
+    weekly_txns = [t for t in transactions if t['day'] >= seven_days_ago and t['type'] == 'expense']
     
     if not weekly_txns:
         return None
         
     num_txns = len(weekly_txns)
-    total_spent = sum(t['amount'] for t in weekly_txns)
+    total_spent = ledger.from_paise(sum(t['amount_paise'] for t in weekly_txns))
     avg_daily_spent = total_spent / 7 if num_txns > 0 else 0
     
     # Highest category
@@ -21,12 +22,8 @@ def get_weekly_insights(transactions, now):
     # Most expensive day of week
     days = {}
     for t in weekly_txns:
-        try:
-            dt = datetime.strptime(t['date'], '%Y-%m-%d')
-            day_name = dt.strftime('%A')
-            days[day_name] = days.get(day_name, 0) + t['amount']
-        except ValueError:
-            pass
+        day_name = ledger.WEEKDAY_NAMES[ledger.weekday(t['day'])]
+        days[day_name] = days.get(day_name, 0) + t['amount']
     expensive_day = max(days, key=days.get) if days else 'None'
     
     return {
@@ -39,56 +36,10 @@ def get_weekly_insights(transactions, now):
     }
 
 def get_smart_suggestions(insights, total_expense_month):
-    """Generate smart suggestions based on weekly insights."""
-    suggestions = []
-    
-    if not insights or insights['total_spent'] <= 0:
-        return ["Add some expenses this week to get personalized insights!"]
-        
-    total_spent = insights['total_spent']
-        
-    # Food suggestion (if > 40% of weekly)
-    food_spent = insights['categories'].get('Food', 0)
-    food_percent = food_spent / total_spent
-    if food_percent > 0.40:
-        savings = round(food_spent * 0.3, 2)
-        suggestions.append(f"🍔 Cooking at home 2 times this week could save ₹{savings}")
-        
-    # Transport suggestion
-    transport_spent = insights['categories'].get('Travel', 0)
-    transport_percent = transport_spent / total_spent
-    if transport_percent > 0.30:
-        savings = round(transport_spent * 0.4, 2)
-        suggestions.append(f"🚌 Using bus instead of auto 3 times could save ₹{savings}")
-        
-    # Desktop/Micro-spending suggestion
-    if insights['num_txns'] > 10:
-        suggestions.append("⚠️ High transaction frequency detected. Beware of micro-spending leaks.")
-
-    # Shopping/Weekend suggestion
-    weekend_spent = insights['categories'].get('Shopping', 0) # Fallback heuristic if no date parsing
-    # Let's count actual weekend spending from the transactions list directly in the insights
-    weekend_total = 0
-    if hasattr(insights, 'days'): # safety if we expose days dictionary
-       pass
-    
-    # Actually, we can use the expensive_day to proxy a warning
-    if insights.get('expensive_day') in ['Saturday', 'Sunday']:
-        suggestions.append("⚠️ High weekend spending detected. Consider planning weekend budgets in advance.")
-    
-    shopping_spent = insights['categories'].get('Shopping', 0)
-    shopping_percent = shopping_spent / total_spent if total_spent > 0 else 0
-    
-    if shopping_percent > 0.25:
-        suggestions.append("🛍️ Reduce online shopping orders this week to protect your budget.")
-        
-    # If doing well
-    if not suggestions and total_spent > 0:
-        suggestions.append("✨ Great job! Your spending categories look well-balanced this week.")
-        
-    return suggestions
+    """Generate smart suggestions based on weekly insights (advice rules, 'weekly' group)."""
+    return advice.RULESET.evaluate(advice.weekly_features(insights), groups=('weekly',))['weekly']
 
-def calculate_streak(transactions):
+def calculate_streak(transactions, today=None):
     """
     Calculate No-Spend streak (consecutive days WITHOUT an expense),
     counting backwards from today.
@@ -97,31 +48,40 @@ def calculate_streak(transactions):
     - Income does NOT break the streak
     - Any expense on a given day breaks the streak
     - Today only counts if there is no expense today
+
+    ``transactions`` is a list of dicts with 'day' and 'type' or a
+    ledger.TransactionColumns; ``today`` is a day number and defaults to
+    ledger.today().
     """
     if not transactions:
         return 0
 
-    expense_dates = set()
-    all_dates = []
+    expense_days = set()
+    earliest = None
+
+    if isinstance(transactions, ledger.TransactionColumns):
+        expense = transactions.type_code_of('expense')
+        earliest = min(transactions.day)
+        expense_days = {
+            day for day, type_code in zip(transactions.day, transactions.type_code) if type_code == expense
+        }
+        transactions = ()
 
     for t in transactions:
-        date_str = t.get('date') if isinstance(t, dict) else getattr(t, 'date', None)
-        if not date_str:
-            continue
-        try:
-            dt = datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
+        day = t.get('day') if isinstance(t, dict) else getattr(t, 'day', None)
+        if day is None:
             continue
 
-        all_dates.append(dt)
+        if earliest is None or day < earliest:
+            earliest = day
         if (t.get('type') if isinstance(t, dict) else getattr(t, 'type', None)) == 'expense':
-            expense_dates.add(dt)
+            expense_days.add(day)
 
-    if not all_dates:
+    if earliest is None:
         return 0
 
-    today = datetime.now().date()
-    earliest = min(all_dates)
+    if today is None:
+        today = ledger.today()
 
     streak = 0
     current = today
@@ -130,10 +90,48 @@ def calculate_streak(transactions):
     for _ in range(365):
         if current < earliest:
             break
-        if current in expense_dates:
+        if current in expense_days:
             break
 
         streak += 1
-        current -= timedelta(days=1)
+        current -= 1
 
     return streak
+
+
+def streak_from_state(first_day, last_expense_day, today, window=365):
+    """
+    calculate_streak() in constant time from the persisted streak state:
+    the streak runs from the day after the latest expense (or the account
+    start) up to today. Only valid when last_expense_day <= today; callers
+    fall back to calculate_streak() for future-dated expenses.
+    """
+    if first_day is None:
+        return 0
+    start = first_day if last_expense_day is None else max(first_day, last_expense_day + 1)
+    return max(0, min(today - start + 1, window))
+
+def current_streak(conn, user_id, today):
+    """The user's no-spend streak as of today, from the persisted streak state."""
+    first_day, last_expense_day = ledger.fetch_streak_state(conn, user_id)
+    if last_expense_day is not None and last_expense_day > today:
+        # A future-dated expense hides the latest one up to today; rescan
+        return calculate_streak(ledger.fetch_streak_days(conn, user_id, today), today)
+    return streak_from_state(first_day, last_expense_day, today)
+
+
+def compute_stability_score(total_income: float, total_expense: float, available_balance: float) -> int:
+    """
+    Shared stability score (0–100) for dashboard and decision engine.
+    Higher when savings ratio is good and expense ratio is lower.
+    """
+    score = 50
+    if total_income > 0:
+        savings_ratio = available_balance / total_income
+        expense_ratio = total_expense / total_income
+        score = 50 + (savings_ratio * 30) - (expense_ratio * 20)
+    else:
+        # If there is only spending and no income logged, penalize
+        score = 50 - (total_expense / 100.0)
+
+    return max(0, min(100, int(score)))
@@ -0,0 +1,57 @@
+"""
+Parsing of pasted UPI / bank SMS messages for Smart Import.
+
+The amount pattern is compiled once at import time and category keywords
+go through the shared categorizer automaton, scanned once per message; the
+rule order below decides which category wins when several keywords appear.
+"""
+import hashlib
+import re
+
+import ledger
+from categorizer import Categorizer, rules_from_table
+
+# Amount such as "Rs. 500", "₹ 100" or "INR 50"
+AMOUNT_RE = re.compile(r'(?:rs\.?|₹|inr)\s*(\d+(?:\.\d+)?)')
+
+# ((category, type), whole_word, keywords) in priority order
+CATEGORY_TABLE = (
+    (('Food', 'expense'), False, ('swiggy', 'zomato', 'food', 'lunch')),
+    (('Food', 'expense'), True, ('tea',)),
+    (('Travel', 'expense'), False, ('uber', 'travel')),
+    (('Travel', 'expense'), True, ('bus', 'ola')),
+    (('Bills', 'expense'), False, ('recharge', 'jio', 'airtel', 'bill')),
+    (('Income', 'income'), False, ('scholarship', 'salary', 'received', 'credited')),
+)
+
+_categorizer = Categorizer(rules_from_table(CATEGORY_TABLE), default=('Other', 'expense'))
+
+
+def classify(message):
+    """Return (category, type) for a message."""
+    return _categorizer.categorize(message)
+
+
+def parse_message(message):
+    """
+    Parse one message into a dict with amount, category, type and
+    description, or return None when no usable amount can be found.
+    """
+    message = message.lower()
+    amount_match = AMOUNT_RE.search(message)
+    amount = float(amount_match.group(1)) if amount_match else 0
+    if not 0 < amount <= ledger.MAX_AMOUNT:
+        return None
+    category, t_type = classify(message)
+    return {
+        'amount': amount,
+        'category': category,
+        'type': t_type,
+        'description': f"Smart Import: {message[:20]}...",
+    }
+
+
+def message_hash(message):
+    """Stable fingerprint used to skip messages that were already imported."""
+    normalized = ' '.join(message.lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
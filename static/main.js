@@ -124,6 +124,47 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
+    // ---- Live updates (Server-Sent Events) ----
+    // Elements marked data-live="balance" etc. are refreshed in place after every write.
+    // When the server has no stream slot free (503) the page polls /api/live_state instead,
+    // slowly and only while it is visible.
+    const LIVE_POLL_MS = 60000;
+    const liveFields = document.querySelectorAll('[data-live]');
+    let livePoll = null;
+
+    function applyLive(data) {
+        liveFields.forEach(el => {
+            const value = data[el.dataset.live];
+            if (value !== undefined) el.textContent = `₹${Math.round(value)}`;
+        });
+    }
+
+    function startLivePolling() {
+        if (livePoll) return;
+        livePoll = setInterval(async () => {
+            if (document.hidden) return;
+            try {
+                const response = await fetch('/api/live_state');
+                if (response.ok) applyLive(await response.json());
+            } catch (err) {
+                console.error(err);
+            }
+        }, LIVE_POLL_MS);
+    }
+
+    if (liveFields.length > 0) {
+        if ('EventSource' in window) {
+            const liveStream = new EventSource('/api/events');
+            liveStream.addEventListener('update', e => applyLive(JSON.parse(e.data)));
+            // EventSource retries dropped connections itself but gives up on an error status
+            liveStream.addEventListener('error', () => {
+                if (liveStream.readyState === EventSource.CLOSED) startLivePolling();
+            });
+        } else {
+            startLivePolling();
+        }
+    }
+
     // ---- Smart Import ----
     const smartImportBtn = document.getElementById('smart-import-btn');
     const smartImportText = document.getElementById('smart-import-text');
@@ -153,6 +194,7 @@ document.addEventListener('DOMContentLoaded', function () {
                     smartImportResult.innerHTML = `<i class="bi bi-check-circle-fill me-1"></i> Imported successfully: <strong>₹${data.amount}</strong> mapped to <strong>${data.category}</strong> (${data.type})`;
                     smartImportResult.className = 'mt-3 text-success small fw-bold p-2 rounded bg-success bg-opacity-10 border-start border-success border-4 shadow-sm';
                     smartImportText.value = '';
+                    // Live events only patch the headline figures; reload for the list, charts and score
                     setTimeout(() => window.location.reload(), 1500);
                 } else {
                     smartImportResult.innerHTML = `<i class="bi bi-x-circle-fill me-1"></i> Failed: ${data.error || 'Amount not found in text.'}`;
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import ledger
+from migrations import migrate
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """A migrated database in a temp directory with users 1 and 2."""
+    conn = db.connect(str(tmp_path / 'finance_tracker.db'))
+    migrate(conn)
+    conn.executemany("INSERT INTO users (username, password) VALUES (?, 'x')", [('u1',), ('u2',)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def add(conn, user_id, amount, category, t_type, day, description=''):
+    ledger.insert_transaction(conn, user_id, amount, category, t_type, description, day)
@@ -0,0 +1,106 @@
+"""Each advice rule on its own, then how RuleSet combines them."""
+import pytest
+
+import advice
+from advice import RULESET, RuleSet, features
+
+# name: (features it matches with, features it doesn't match with, rendered message)
+CASES = {
+    'weekly_no_expenses': (
+        {'week_spent': 0}, {'week_spent': 10},
+        "Add some expenses this week to get personalized insights!"),
+    'weekly_food': (
+        {'week_food': 500, 'week_food_share': 0.5}, {'week_food': 400, 'week_food_share': 0.40},
+        "🍔 Cooking at home 2 times this week could save ₹150.0"),
+    'weekly_travel': (
+        {'week_travel': 333.33, 'week_travel_share': 0.31}, {'week_travel_share': 0.30},
+        "🚌 Using bus instead of auto 3 times could save ₹133.33"),
+    'weekly_frequency': (
+        {'week_txns': 11}, {'week_txns': 10},
+        "⚠️ High transaction frequency detected. Beware of micro-spending leaks."),
+    'weekly_weekend': (
+        {'week_expensive_day': 'Sunday'}, {'week_expensive_day': 'Friday'},
+        "⚠️ High weekend spending detected. Consider planning weekend budgets in advance."),
+    'weekly_shopping': (
+        {'week_shopping_share': 0.26}, {'week_shopping_share': 0.25},
+        "🛍️ Reduce online shopping orders this week to protect your budget."),
+    'top_category': (
+        {'highest_category': 'Food'}, {},
+        "Most of your money is going to Food."),
+    'top_weekday': (
+        {'highest_day': 'Monday'}, {},
+        "You spend the most on Mondays."),
+    'transaction_count': (
+        {'month_txns': 7}, None,
+        "You made 7 transactions recently."),
+    'average_daily': (
+        {'avg_daily_spend': 123.9}, None,
+        "Average daily spend is ₹123."),
+    'month_food': (
+        {'food_share': 0.5, 'food_expense': 1001}, {'food_share': 0.40},
+        "🍔 Cooking at home could save you ₹300 this month."),
+    'month_weekend': (
+        {'weekend_share': 0.31}, {'weekend_share': 0.30},
+        "⚠️ High weekend spending detected. Carefully plan weekend outings."),
+    'month_frequency': (
+        {'month_txns': 16}, {'month_txns': 15},
+        "🛍️ Frequent micro-spending detected. Try consolidating purchases."),
+}
+
+
+def test_every_rule_has_a_case():
+    assert set(CASES) == {rule.name for rule in RULESET.rules}
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_rule(name):
+    matching, missing, message = CASES[name]
+    rule = RULESET.rule(name)
+    assert rule.matches(features(**matching))
+    assert rule.render(features(**matching)) == message
+    if missing is not None:
+        assert not rule.matches(features(**missing))
+
+
+def test_stop_rule_replaces_its_group():
+    vector = features(week_spent=0, week_txns=12, week_expensive_day='Saturday')
+    assert RULESET.evaluate(vector, groups=('weekly',)) == {
+        'weekly': ["Add some expenses this week to get personalized insights!"]}
+
+
+def test_matches_keep_rule_order():
+    vector = features(week_spent=100, week_txns=12, week_shopping_share=0.5)
+    assert RULESET.evaluate(vector, groups=('weekly',))['weekly'] == [
+        CASES['weekly_frequency'][2], CASES['weekly_shopping'][2]]
+
+
+@pytest.mark.parametrize('group', ['weekly', 'advice'])
+def test_otherwise_when_nothing_matches(group):
+    vector = features(week_spent=100)
+    assert RULESET.evaluate(vector, groups=(group,)) == {group: [advice.OTHERWISE[group]]}
+
+
+def test_behaviour_has_no_fallback():
+    messages = RULESET.evaluate(features(), groups=('behaviour',))['behaviour']
+    assert messages == ["You made 0 transactions recently.", "Average daily spend is ₹0."]
+
+
+def test_evaluate_many_matches_evaluate():
+    vectors = [features(week_spent=0), features(week_spent=50, week_txns=20), advice.weekly_features(None)]
+    assert RULESET.evaluate_many(vectors) == [RULESET.evaluate(v) for v in vectors]
+
+
+@pytest.mark.parametrize('spec, error', [
+    ({'name': 'x', 'group': 'g', 'when': [('nope', '>', 0)], 'message': ''}, "unknown feature 'nope'"),
+    ({'name': 'x', 'group': 'g', 'when': [('week_txns', '=~', 0)], 'message': ''}, "unknown operator"),
+    ({'name': 'x', 'group': 'g', 'message': '{nope}'}, "unknown feature 'nope'"),
+])
+def test_bad_specs_fail_at_compile_time(spec, error):
+    with pytest.raises(ValueError, match=error):
+        RuleSet([spec])
+
+
+def test_duplicate_names_fail():
+    spec = {'name': 'x', 'group': 'g', 'message': 'hi'}
+    with pytest.raises(ValueError, match='Duplicate'):
+        RuleSet([spec, spec])
@@ -0,0 +1,40 @@
+"""The sqlite live events backend only publishes while a stream is open."""
+from events import EventBus
+
+
+def database(conn):
+    return conn.execute('PRAGMA database_list').fetchone()['file']
+
+
+def test_listener_registry(conn):
+    bus = EventBus('sqlite', database(conn), poll_interval=0.01)
+    assert not bus.has_listeners(conn, 1)
+
+    stream = bus.stream(1, max_seconds=1, heartbeat=0.05)
+    assert next(stream).startswith('retry:')
+    assert bus.has_listeners(conn, 1)
+    assert not bus.has_listeners(conn, 2)
+
+    bus.publish(conn, 1, 'update', {'balance': 5})
+    assert '"balance": 5' in next(stream)
+    stream.close()
+    assert not bus.has_listeners(conn, 1)
+
+
+def test_expired_lease_stops_counting(conn):
+    bus = EventBus('sqlite', database(conn))
+    stream = bus.stream(1, max_seconds=1)
+    next(stream)
+    # A worker that died without closing its stream
+    conn.execute('UPDATE live_listeners SET expires = 0')
+    conn.commit()
+    assert not bus.has_listeners(conn, 1)
+    stream.close()
+
+
+def test_stream_slots(conn):
+    bus = EventBus('memory', max_streams=1)
+    first = bus.stream(1)
+    assert bus.stream(2) is None
+    first.close()
+    assert bus.stream(2) is not None
@@ -0,0 +1,34 @@
+"""import_transactions() on broken uploads."""
+import io
+
+import importer
+
+
+def run(conn, data, filename='upload.csv', batch_size=2):
+    return importer.import_transactions(conn, 1, io.BytesIO(data), filename, lambda text: 'Others',
+                                        batch_size=batch_size)
+
+
+def count(conn):
+    return conn.execute('SELECT COUNT(*) FROM transactions').fetchone()[0]
+
+
+def test_bad_rows_are_rejected_alone(conn):
+    summary = run(conn, b'amount,description\n10,tea\nabc,x\n1e400,y\nnan,z\n20,bus\n')
+    assert (summary['accepted'], summary['rejected']) == (2, 3)
+    assert 'error' not in summary
+    assert count(conn) == 2
+
+
+def test_unterminated_quote_keeps_committed_batches(conn):
+    rows = b''.join(b'%d,row\n' % (i + 1) for i in range(50000))
+    summary = run(conn, b'amount,description\n10,ok\n30,ok\n20,"unterminated\n' + rows)
+    assert summary['error'].startswith('Malformed CSV')
+    assert summary['accepted'] == 2
+    assert count(conn) == 2
+
+
+def test_non_utf8_keeps_committed_batches(conn):
+    summary = run(conn, b'amount,description\n10,a\n20,b\n30,\xff\xfe\n')
+    assert summary['error'] == 'File must be UTF-8 text'
+    assert summary['accepted'] == count(conn)
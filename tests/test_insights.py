@@ -0,0 +1,125 @@
+"""ledger.fetch_insights_aggregates() against the /insights loop it replaced."""
+import random
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+
+import ledger
+from conftest import add
+
+CATEGORIES = ('Food', 'Travel', 'Shopping', 'Others', 'Income')
+
+
+def baseline_insights(conn, user_id, now):
+    """
+    The pre-rollup insights() loop: date strings, rupee amounts and the
+    current month picked with startswith(), over transactions newest first.
+    """
+    transactions = [
+        {'amount': ledger.from_paise(row['amount_paise']), 'category': row['category'],
+         'type': row['type'], 'date': ledger.from_day(row['day'])}
+        for row in conn.execute(
+            'SELECT amount_paise, category, type, day FROM transactions WHERE user_id = ? ORDER BY day DESC, id',
+            (user_id,))
+    ]
+    total_income = 0
+    total_expense = 0
+    category_totals = defaultdict(float)
+    daily_totals = defaultdict(float)
+    week_totals = {'Monday': 0, 'Tuesday': 0, 'Wednesday': 0, 'Thursday': 0, 'Friday': 0, 'Saturday': 0, 'Sunday': 0}
+    current_month_prefix = f"{now.year}-{now.month:02d}"
+    current_month_expense = 0
+    weekend_expense = 0
+    food_expense = 0
+    recent_transactions_count = 0
+
+    for t in transactions:
+        amount = t['amount']
+        t_date = t['date']
+        if t['type'] == 'income':
+            total_income += amount
+        else:
+            total_expense += amount
+            category_totals[t['category']] += amount
+            daily_totals[t_date] += amount
+            day_name = datetime.strptime(t_date, '%Y-%m-%d').strftime('%A')
+            week_totals[day_name] += amount
+            if day_name in ['Saturday', 'Sunday']:
+                weekend_expense += amount
+            if t['category'] == 'Food':
+                food_expense += amount
+            if t_date.startswith(current_month_prefix):
+                current_month_expense += amount
+                recent_transactions_count += 1
+
+    sorted_dates = sorted(daily_totals.keys())[-30:]
+    return {
+        'income': total_income,
+        'expense': total_expense,
+        'weekend_expense': weekend_expense,
+        'food_expense': food_expense,
+        'month_expense': current_month_expense,
+        'month_count': recent_transactions_count,
+        'categories': dict(category_totals),
+        'category_order': list(category_totals),
+        'daily': [(d, daily_totals[d]) for d in sorted_dates],
+        'weekdays': list(week_totals.values()),
+    }
+
+
+def assert_parity(conn, user_id, now):
+    expected = baseline_insights(conn, user_id, now)
+    agg = ledger.fetch_insights_aggregates(conn, user_id, ledger.month_start(now))
+    for key in ('income', 'expense', 'weekend_expense', 'food_expense', 'month_expense'):
+        assert ledger.from_paise(agg[key]) == pytest.approx(expected[key]), key
+    assert agg['month_count'] == expected['month_count']
+    assert {c: ledger.from_paise(v) for c, v in agg['categories']} == pytest.approx(expected['categories'])
+    assert [ledger.from_day(d) for d, _ in agg['daily']] == [d for d, _ in expected['daily']]
+    assert [ledger.from_paise(v) for _, v in agg['daily']] == pytest.approx([v for _, v in expected['daily']])
+    assert [ledger.from_paise(v) for v in agg['weekdays']] == pytest.approx(expected['weekdays'])
+
+    # Categories come most recently used first. Categories last used on the
+    # same day are ordered by name here but by insertion order in the loop,
+    # so compare the order by each category's last day.
+    last_used = dict(conn.execute(
+        "SELECT category, MAX(day) FROM transactions WHERE user_id = ? AND type <> 'income' GROUP BY category",
+        (user_id,)).fetchall())
+    assert [last_used[c] for c, _ in agg['categories']] == [last_used[c] for c in expected['category_order']]
+
+
+def test_empty_account(conn):
+    assert_parity(conn, 1, datetime.now())
+
+
+def test_matches_loop_on_random_accounts(conn):
+    rnd = random.Random(5)
+    today = ledger.today()
+    for _ in range(600):
+        user_id = rnd.choice((1, 2))
+        t_type = 'income' if rnd.random() < 0.15 else 'expense'
+        add(conn, user_id, round(rnd.uniform(1, 900), 2), rnd.choice(CATEGORIES), t_type, today - rnd.randint(-20, 120))
+    conn.commit()
+    for user_id in (1, 2):
+        assert_parity(conn, user_id, datetime.now())
+
+
+def test_future_expenses_stay_out_of_the_month(conn):
+    today = ledger.today()
+    add(conn, 1, 100, 'Food', 'expense', today)
+    add(conn, 1, 250, 'Food', 'expense', today + 40)
+    conn.commit()
+    agg = ledger.fetch_insights_aggregates(conn, 1, ledger.month_start(datetime.now()))
+    assert (agg['month_count'], agg['month_expense']) == (1, 10000)
+    assert_parity(conn, 1, datetime.now())
+
+
+def test_deletes_and_edits_keep_parity(conn):
+    rnd = random.Random(11)
+    today = ledger.today()
+    for _ in range(200):
+        add(conn, 1, rnd.randint(1, 500), rnd.choice(CATEGORIES), rnd.choice(('expense', 'income')), today - rnd.randint(0, 60))
+    conn.execute('DELETE FROM transactions WHERE id % 3 = 0')
+    conn.execute("UPDATE transactions SET category = 'Food', day = day - 7 WHERE id % 5 = 0")
+    conn.commit()
+    assert_parity(conn, 1, datetime.now())
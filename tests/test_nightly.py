@@ -0,0 +1,31 @@
+"""Batched parts of the nightly pipeline agree with one user at a time."""
+from datetime import datetime
+
+import ledger
+import nightly
+from conftest import add
+
+
+def test_batched_forecasts_match_single_users(conn):
+    now = datetime.now()
+    today = ledger.today()
+    add(conn, 1, 20000, 'Income', 'income', ledger.month_start(now))
+    add(conn, 2, 5000, 'Income', 'income', ledger.month_start(now))
+    for k in range(40):
+        add(conn, 1, 50 + k, 'Food', 'expense', today - k)
+        add(conn, 2, 300, 'Travel', 'expense', today - 2 * k)
+    conn.commit()
+
+    batch = [nightly.compute_user_analytics(conn, user_id, now, complete=False) for user_id in (1, 2)]
+    nightly.add_forecasts(conn, [1, 2], batch, now)
+    for user_id, analytics in zip((1, 2), batch):
+        assert analytics['forecast'] == nightly.compute_user_analytics(conn, user_id, now)['forecast']
+
+    first = batch[0]['forecast']
+    assert set(first['month_end_balance']) == {'flat', 'ewma', 'seasonal'}
+    assert 0 < first['days_until_zero'] < 999
+
+
+def test_no_spending_never_runs_out(conn):
+    analytics = nightly.compute_user_analytics(conn, 1, datetime.now())
+    assert analytics['forecast']['days_until_zero'] == 999
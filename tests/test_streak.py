@@ -0,0 +1,56 @@
+"""The persisted streak state against calculate_streak()'s scan."""
+import random
+
+import ledger
+import predictions
+from conftest import add
+
+
+def test_state_matches_scan():
+    rnd = random.Random(7)
+    today = ledger.today()
+    for _ in range(20000):
+        transactions = [
+            {'day': today + rnd.randint(-500, 0), 'type': rnd.choice(('expense', 'income'))}
+            for _ in range(rnd.randint(0, 8))
+        ]
+        first_day = min((t['day'] for t in transactions), default=None)
+        last_expense_day = max((t['day'] for t in transactions if t['type'] == 'expense'), default=None)
+        assert predictions.streak_from_state(first_day, last_expense_day, today) == \
+            predictions.calculate_streak(transactions, today)
+
+
+def test_triggers_keep_state_equal_to_rebuild(conn):
+    rnd = random.Random(3)
+    today = ledger.today()
+    for user_id in (3, 4, 5):
+        conn.execute("INSERT INTO users (username, password) VALUES (?, 'x')", (f'u{user_id}',))
+    for step in range(3000):
+        op = rnd.random()
+        user_id = rnd.randint(1, 5)
+        if op < 0.6:
+            add(conn, user_id, rnd.randint(1, 500), 'Food', rnd.choice(('expense', 'income')), today - rnd.randint(0, 400))
+        elif op < 0.8:
+            conn.execute('DELETE FROM transactions WHERE id = (SELECT id FROM transactions WHERE user_id = ? ORDER BY RANDOM() LIMIT 1)',
+                         (user_id,))
+        else:
+            conn.execute('UPDATE transactions SET day = ?, type = ?, user_id = ? WHERE id = (SELECT id FROM transactions ORDER BY RANDOM() LIMIT 1)',
+                         (today - rnd.randint(0, 400), rnd.choice(('expense', 'income')), rnd.randint(1, 5)))
+        if step % 100 == 0:
+            state = [ledger.fetch_streak_state(conn, user_id) for user_id in range(1, 6)]
+            ledger.rebuild_streak_state(conn)
+            assert state == [ledger.fetch_streak_state(conn, user_id) for user_id in range(1, 6)], step
+            for user_id, (first_day, last_expense_day) in enumerate(state, 1):
+                assert predictions.streak_from_state(first_day, last_expense_day, today) == \
+                    predictions.calculate_streak(ledger.fetch_streak_days(conn, user_id, today), today)
+
+
+def test_future_expense_falls_back_to_scan(conn):
+    today = ledger.today()
+    add(conn, 1, 100, 'Food', 'expense', today - 30)
+    add(conn, 1, 100, 'Food', 'expense', today - 4)
+    add(conn, 1, 100, 'Food', 'expense', today + 10)
+    conn.commit()
+    assert predictions.current_streak(conn, 1, today) == 4
+    # Asked about an earlier day, the fallback counts back from that day
+    assert predictions.current_streak(conn, 1, today - 10) == 20
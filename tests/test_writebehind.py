@@ -0,0 +1,41 @@
+"""WriteBehindQueue keeps one bad row from blocking the rest."""
+import pytest
+
+import ledger
+from writebehind import WriteBehindQueue
+
+
+@pytest.fixture
+def queue(conn):
+    queue = WriteBehindQueue(conn.execute('PRAGMA database_list').fetchone()['file'], interval=60)
+    yield queue
+    queue.close()
+
+
+def test_submit_rejects_malformed_rows(queue):
+    day = ledger.today()
+    for row in [
+        (1, 1000, 'Food', 'expense', {'x': 1}, day),
+        (1, 10.5, 'Food', 'expense', 'tea', day),
+        (1, 0, 'Food', 'expense', 'tea', day),
+        (1, 1000, 'Food', 'refund', 'tea', day),
+        (1, 1000, 'Food', 'expense', 'tea'),
+    ]:
+        with pytest.raises(ValueError):
+            queue.submit(row)
+    assert not queue.has_pending(1)
+
+
+def test_bad_row_is_set_aside(conn, queue):
+    day = ledger.today()
+    queue.submit((1, 1000, 'Food', 'expense', 'tea', day))
+    queue.submit((2, 2000, 'Travel', 'expense', 'bus', day))
+    # Slipped past submit(): fails to bind at insert time
+    queue._rows.insert(1, (1, 500, 'Food', 'expense', {'x': 1}, day))
+    queue._users[1] += 1
+
+    assert queue.flush() == 2
+    assert not queue.has_pending(1) and not queue.has_pending(2)
+    assert queue.stats['rejected'] == 1 and len(queue.rejected) == 1
+    rows = conn.execute('SELECT user_id, amount_paise FROM transactions ORDER BY user_id').fetchall()
+    assert [tuple(row) for row in rows] == [(1, 1000), (2, 2000)]
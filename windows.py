@@ -0,0 +1,165 @@
+"""
+Rolling-window spending statistics.
+
+A RollingWindows holds one user's expense rollups bucketed by day for the
+last ``max(sizes)`` days and keeps running totals (amount, transaction
+count, per category, per weekday) for every window size at once. A window
+of size N covers today and the N days before it, matching the ranges the
+dashboard has always used. When the date moves on, days leaving a window
+are subtracted and days entering it are added, so nothing is rescanned.
+
+WindowStore keeps one RollingWindows per user in an LRU-bounded in-process
+cache. An entry is reused (and rolled forward) while the user's
+data_version is unchanged and rebuilt from a single rollup query when it
+isn't.
+"""
+import threading
+from collections import OrderedDict
+
+import ledger
+from cache import get_data_version
+
+WINDOW_SIZES = (7, 30, 90)
+
+
+class _Totals:
+    __slots__ = ('paise', 'count', 'categories', 'weekdays')
+
+    def __init__(self):
+        self.paise = 0
+        self.count = 0
+        self.categories = {}
+        self.weekdays = [0] * 7
+
+    def apply(self, day, bucket, sign):
+        for category, (paise, count) in bucket.items():
+            self.paise += sign * paise
+            self.count += sign * count
+            self.weekdays[ledger.weekday(day)] += sign * paise
+            total = self.categories.get(category, 0) + sign * paise
+            if total:
+                self.categories[category] = total
+            else:
+                self.categories.pop(category, None)
+
+
+class RollingWindows:
+    def __init__(self, today, sizes=WINDOW_SIZES):
+        self.sizes = tuple(sorted(sizes))
+        self.span = self.sizes[-1]
+        self.today = today
+        self._days = {}  # day -> {category: [paise, count]}
+        self._totals = {size: _Totals() for size in self.sizes}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rollups(cls, conn, user_id, today, sizes=WINDOW_SIZES):
+        """Build a user's windows from one daily_rollups query."""
+        windows = cls(today, sizes)
+        for row in ledger.iter_rollups(conn, user_id, since=today - windows.span, t_type='expense'):
+            windows.add(row['day'], row['category'], row['total_paise'], row['txn_count'])
+        return windows
+
+    def _covers(self, size, day):
+        return self.today - size <= day <= self.today
+
+    def add(self, day, category, paise, count=1):
+        """Record spending on a day; days outside every window are ignored."""
+        with self._lock:
+            if day < self.today - self.span:
+                return
+            bucket = self._days.setdefault(day, {})
+            entry = bucket.setdefault(category, [0, 0])
+            entry[0] += paise
+            entry[1] += count
+            for size in self.sizes:
+                if self._covers(size, day):
+                    self._totals[size].apply(day, {category: (paise, count)}, 1)
+
+    def advance(self, today):
+        """Roll every window forward to ``today``, evicting the days that left."""
+        with self._lock:
+            if today <= self.today:
+                return
+            old_today = self.today
+            for size in self.sizes:
+                totals = self._totals[size]
+                if today - old_today > size:
+                    totals = self._totals[size] = _Totals()
+                    entering = range(today - size, today + 1)
+                else:
+                    for day in range(old_today - size, today - size):
+                        if day in self._days:
+                            totals.apply(day, self._days[day], -1)
+                    entering = range(old_today + 1, today + 1)
+                for day in entering:
+                    if day in self._days:
+                        totals.apply(day, self._days[day], 1)
+            self.today = today
+            for day in [d for d in self._days if d < today - self.span]:
+                del self._days[day]
+
+    def daily(self, size):
+        """Spend in paise for each day of the window, oldest first."""
+        with self._lock:
+            return [
+                sum(paise for paise, _ in self._days.get(day, {}).values())
+                for day in range(self.today - size, self.today + 1)
+            ]
+
+    def insights(self, size):
+        """
+        Spending insights for one window in the shape of
+        predictions.get_weekly_insights(), or None without expenses.
+        """
+        if size not in self._totals:
+            raise ValueError(f"Unknown window {size}; expected one of {self.sizes}")
+        with self._lock:
+            totals = self._totals[size]
+            if not totals.count:
+                return None
+            categories = {category: ledger.from_paise(paise) for category, paise in totals.categories.items()}
+            weekdays = list(totals.weekdays)
+            total_spent = ledger.from_paise(totals.paise)
+            num_txns = totals.count
+            start = self.today - size
+        # Weekdays in the order they first occur in the window, as before
+        order = [ledger.weekday(start + i) for i in range(7)]
+        days = {ledger.WEEKDAY_NAMES[w]: weekdays[w] for w in order if weekdays[w]}
+        return {
+            'total_spent': total_spent,
+            'num_txns': num_txns,
+            'avg_daily_spent': total_spent / size,
+            'highest_category': max(categories, key=categories.get) if categories else 'None',
+            'expensive_day': max(days, key=days.get) if days else 'None',
+            'categories': categories,
+        }
+
+
+class WindowStore:
+    def __init__(self, max_users=1024, sizes=WINDOW_SIZES):
+        self.max_users = max_users
+        self.sizes = tuple(sorted(sizes))
+        self._users = OrderedDict()  # user_id -> (data_version, RollingWindows)
+        self._lock = threading.Lock()
+
+    def get(self, conn, user_id, today):
+        """The user's RollingWindows rolled forward to ``today``."""
+        version = get_data_version(conn, user_id)
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] == version and entry[1].today <= today:
+                self._users.move_to_end(user_id)
+                windows = entry[1]
+            else:
+                windows = None
+        if windows is not None:
+            windows.advance(today)
+            return windows
+        windows = RollingWindows.from_rollups(conn, user_id, today, self.sizes)
+        with self._lock:
+            self._users[user_id] = (version, windows)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return windows
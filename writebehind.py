@@ -0,0 +1,187 @@
+"""
+Write-behind queue for high-frequency inserts (quick add).
+
+Rows are queued in memory and a background thread writes them in grouped
+transactions every ``interval`` seconds or as soon as ``max_batch`` rows
+are waiting, so a burst of taps costs one commit instead of one each.
+
+Read-your-writes: before a request reads a user's data the app calls
+``flush_user()``, which writes that user's queued rows (along with
+everyone else's) straight away, so pages never miss a row the user just
+added. Queued rows are flushed on shutdown; a hard kill of the process can
+lose at most the rows queued in the last interval.
+
+Rows are checked on submit(). If a batch still fails to insert, its rows
+are retried one at a time and the ones that fail again are set aside in
+``rejected`` rather than blocking the rows queued behind them. Only
+operational errors (a locked or unwritable database) put the batch back
+for the next attempt.
+"""
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import db
+import ledger
+
+
+def check_row(row):
+    """Raise ValueError unless ``row`` is a well-formed transactions row."""
+    try:
+        user_id, amount_paise, category, t_type, description, day = row
+    except (TypeError, ValueError):
+        raise ValueError('row must have six fields') from None
+    if not isinstance(amount_paise, int) or amount_paise <= 0:
+        raise ValueError('amount must be a positive number of paise')
+    if t_type not in ('expense', 'income'):
+        raise ValueError(f'unknown type {t_type!r}')
+    if not isinstance(category, str) or not isinstance(description, str):
+        raise ValueError('category and description must be text')
+    if not isinstance(user_id, int) or not isinstance(day, int):
+        raise ValueError('user_id and day must be integers')
+
+
+class WriteBehindQueue:
+    def __init__(self, database, interval=0.05, max_batch=500, on_flush=None):
+        self.database = database
+        self.interval = interval
+        self.max_batch = max_batch
+        self.on_flush = on_flush  # called as on_flush(conn, user_ids) after each commit
+        self._rows = []
+        self._users = {}  # user_id -> queued row count
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._conn = None
+        self.rejected = deque(maxlen=100)  # (row, error) for rows that would not insert
+        self.stats = {'queued': 0, 'flushed': 0, 'batches': 0, 'errors': 0, 'rejected': 0}
+        atexit.register(self.close)
+
+    def submit(self, row):
+        """
+        Queue one ledger.insert_transactions() row. Raises ValueError for a
+        row that could never be inserted, so the caller can refuse it.
+        """
+        check_row(row)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('write-behind queue is closed')
+            self._ensure_thread()
+            self._rows.append(row)
+            self._users[row[0]] = self._users.get(row[0], 0) + 1
+            self.stats['queued'] += 1
+            if len(self._rows) >= self.max_batch:
+                self._wake.set()
+
+    def has_pending(self, user_id):
+        return user_id in self._users
+
+    def flush_user(self, user_id):
+        """Write the queue now if it holds rows for this user."""
+        if user_id in self._users:
+            self.flush()
+
+    def flush(self):
+        """Write every queued row in one transaction. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if not rows:
+                return 0
+            conn = self._connection()
+            try:
+                written, rejected = self._write(conn, rows)
+            except Exception:
+                conn.rollback()
+                with self._lock:
+                    self._rows[:0] = rows  # keep them for the next attempt
+                    self.stats['errors'] += 1
+                raise
+            for row, error in rejected:
+                print(f"Write-behind dropped row for user {row[0]}: {error}")
+            user_ids = {row[0] for row in written}
+            with self._lock:
+                for row in rows:
+                    left = self._users[row[0]] - 1
+                    if left:
+                        self._users[row[0]] = left
+                    else:
+                        del self._users[row[0]]
+                self.rejected.extend(rejected)
+                self.stats['flushed'] += len(written)
+                self.stats['rejected'] += len(rejected)
+                self.stats['batches'] += 1
+            if self.on_flush is not None and user_ids:
+                self.on_flush(conn, user_ids)
+            return len(written)
+
+    @staticmethod
+    def _write(conn, rows):
+        """
+        Insert and commit ``rows``, falling back to one row at a time when
+        the batch fails. Returns (written rows, [(row, error)] rejected).
+        Operational errors propagate so the caller requeues the batch.
+        """
+        try:
+            ledger.insert_transactions(conn, rows)
+            conn.commit()
+            return rows, []
+        except sqlite3.OperationalError:
+            raise
+        except Exception:
+            conn.rollback()
+        written, rejected = [], []
+        for row in rows:
+            try:
+                ledger.insert_transactions(conn, [row])
+            except sqlite3.OperationalError:
+                raise
+            except Exception as e:
+                rejected.append((row, repr(e)))
+            else:
+                written.append(row)
+        conn.commit()
+        return written, rejected
+
+    def close(self):
+        """Stop the writer and flush whatever is still queued."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = db.connect(self.database)
+        return self._conn
+
+    def _ensure_thread(self):
+        # Started lazily, and again after a fork, since threads don't survive one
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._conn = None
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Write-behind flush failed: {e}")
+                time.sleep(self.interval)